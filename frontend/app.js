@@ -4,6 +4,7 @@ let audioRecorder = null;
 let websocket = null;
 let isRecording = false;
 let audioConfig = null; // Will be loaded from /api/config
+let audioSeq = 0; // Sequence number for binary audio frames
 
 const startBtn = document.getElementById('startBtn');
 const stopBtn = document.getElementById('stopBtn');
@@ -93,6 +94,7 @@ async function startRecording() {
                 }
             };
             websocket.send(JSON.stringify(startMessage));
+            audioSeq = 0;
 
             // Create AudioRecorder instead of MediaRecorder
             audioRecorder = new AudioRecorder(
@@ -157,28 +159,37 @@ function stopRecording() {
     updateUI();
 }
 
-function sendAudioChunk(blob) {
+async function sendAudioChunk(blob) {
     console.log(`📤 Sending audio chunk: ${blob.size} bytes, type: ${blob.type}`);
-    const reader = new FileReader();
-    reader.onloadend = () => {
-        const base64Data = reader.result.split(',')[1];
-        const message = {
+    try {
+        // Binary frame: [4-byte big-endian header length][JSON header][WAV bytes]
+        const header = new TextEncoder().encode(JSON.stringify({
             type: 'audio_chunk',
-            audio_data: base64Data
-        };
-        websocket.send(JSON.stringify(message));
-        console.log(`✅ Sent audio chunk: ${blob.size} bytes (${base64Data.length} chars base64)`);
-    };
-    reader.onerror = (error) => {
-        console.error('❌ FileReader error:', error);
-    };
-    reader.readAsDataURL(blob);
+            source: 'mic',
+            seq: audioSeq++
+        }));
+        const audio = new Uint8Array(await blob.arrayBuffer());
+        const frame = new Uint8Array(4 + header.length + audio.length);
+        new DataView(frame.buffer).setUint32(0, header.length);
+        frame.set(header, 4);
+        frame.set(audio, 4 + header.length);
+
+        if (websocket && websocket.readyState === WebSocket.OPEN) {
+            websocket.send(frame);
+            console.log(`✅ Sent audio chunk: ${blob.size} bytes (${frame.length} bytes framed)`);
+        }
+    } catch (error) {
+        console.error('❌ Failed to send audio chunk:', error);
+    }
 }
 
 function handleWebSocketMessage(message) {
     console.log('Received message:', message.type);
     
-    if (message.type === 'extraction_update') {
+    if (message.type === 'batch') {
+        // Server coalesces bursts of updates into one frame
+        message.items.forEach(handleWebSocketMessage);
+    } else if (message.type === 'extraction_update') {
         updateExtractionSections(message.extraction);
     } else if (message.type === 'error') {
         console.error('Server error:', message.message);
@@ -20,6 +20,10 @@ class ExtractionConfig(BaseModel):
     model: str
     temperature: float = 0.3
     min_transcript_length: int = 30  # Minimum chars before triggering extraction
+    max_rps: int = 2  # Global cap on extraction requests per second (all sessions)
+    delta_chars: int = 200  # New transcript chars that trigger an extraction...
+    min_interval_s: float = 15.0  # ...or seconds since the last one, whichever comes first
+    max_transcript_chars: int = 20000  # Rolling transcript window kept for extraction
 
 
 class OpenAIConfig(BaseModel):
@@ -55,6 +59,7 @@ class ServerConfig(BaseModel):
     """Server configuration."""
     host: str = "0.0.0.0"
     port: int = 8000
+    ws_per_message_deflate: bool = True  # Compress JSON text frames (extraction updates)
 
 
 class AudioSettings(BaseModel):
@@ -62,6 +67,8 @@ class AudioSettings(BaseModel):
     chunk_duration_seconds: int = 5
     sample_rate: int = 16000
     channels: int = 1
+    workers: int = 4  # Thread pool size for CPU-side audio processing
+    max_concurrent_saves: int = 2  # Sessions combining/saving audio at the same time
 
 
 class AudioStorageConfig(BaseModel):
@@ -1,4 +1,5 @@
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
@@ -26,8 +27,15 @@ logger = logging.getLogger(__name__)
 # Load settings
 settings = load_settings()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Let session finalization finish before the server exits."""
+    yield
+    await ws_handler.shutdown()
+
+
 # Create FastAPI app
-app = FastAPI(title="drTranscribe", version="2.0.0")
+app = FastAPI(title="drTranscribe", version="2.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -109,5 +117,6 @@ if __name__ == "__main__":
         app,
         host=settings.server.host,
         port=settings.server.port,
+        ws_per_message_deflate=settings.server.ws_per_message_deflate,
         log_level="info"
     )
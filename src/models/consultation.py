@@ -1,7 +1,9 @@
+import time
+from collections import deque
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Deque, List, Optional
+from pydantic import BaseModel, Field, PrivateAttr
 from .patient import Patient
 from .extraction import ExtractionResult
 
@@ -30,22 +32,102 @@ class ConsultationSession(BaseModel):
     mic_chunk_count: int = Field(default=0, description="Sequential mic chunk counter")
     tab_chunk_count: int = Field(default=0, description="Sequential tab chunk counter")
     audio_saved_path: Optional[str] = Field(default=None, description="Path to final saved audio file")
+
+    finalized: bool = Field(default=False, description="Set once final extraction/save has been started")
+
+    # Extraction debounce tracking
+    last_extraction_len: int = Field(default=0, description="Transcript length at the last extraction")
+    last_extraction_ts: float = Field(default=0.0, description="Session elapsed_seconds() at the last extraction")
+
+    # Max transcript chars kept in memory as text for extraction (rolling window)
+    transcript_window_chars: int = Field(default=20000, description="Rolling transcript window for extraction")
+
+    # Rolling window of transcript lines ("\n"-prefixed after the first line).
+    # Offsets are absolute positions in the full transcript; text that scrolls
+    # out of the window is still kept in transcript_chunks for the archive.
+    _window: Deque[str] = PrivateAttr(default_factory=deque)
+    _window_chars: int = PrivateAttr(default=0)
+    _window_start: int = PrivateAttr(default=0)
+    _window_text: Optional[str] = PrivateAttr(default=None)
+    _total_chars: int = PrivateAttr(default=0)
+    # Monotonic clock at creation, for cheap per-chunk elapsed time
+    _start_monotonic: float = PrivateAttr(default_factory=time.monotonic)
     
+    def reset(self) -> None:
+        """Clear all per-consultation state so the object can be reused.
+
+        Identity fields (session_id, patient, appointment_id, started_at) are
+        left for the caller to overwrite.
+        """
+        self.transcript_chunks.clear()
+        self.extraction = ExtractionResult()
+        self.mic_chunk_paths.clear()
+        self.tab_chunk_paths.clear()
+        self.mic_chunk_count = 0
+        self.tab_chunk_count = 0
+        self.audio_saved_path = None
+        self.finalized = False
+        self.last_extraction_len = 0
+        self.last_extraction_ts = 0.0
+        # Handler re-applies the configured size on start; don't leak the old one
+        self.transcript_window_chars = type(self).model_fields["transcript_window_chars"].default
+        self._window.clear()
+        self._window_chars = 0
+        self._window_start = 0
+        self._window_text = None
+        self._total_chars = 0
+        self._start_monotonic = time.monotonic()
+
     def add_transcript_chunk(self, chunk: TranscriptChunk) -> None:
         """Add a structured transcript chunk to the session."""
         if chunk.text.strip():
             self.transcript_chunks.append(chunk)
+            line = f"{chunk.speaker}: {chunk.text}"
+            if self._total_chars:
+                line = "\n" + line
+            self._window.append(line)
+            self._window_chars += len(line)
+            self._total_chars += len(line)
+            # Drop the oldest lines once over the limit (always keep the newest)
+            while self._window_chars > self.transcript_window_chars and len(self._window) > 1:
+                dropped = self._window.popleft()
+                self._window_chars -= len(dropped)
+                self._window_start += len(dropped)
+            self._window_text = None
     
+    def elapsed_seconds(self) -> float:
+        """Seconds since the session started (monotonic clock)."""
+        return time.monotonic() - self._start_monotonic
+
     def update_extraction(self, new_extraction: ExtractionResult) -> None:
         """Update extraction by merging with new extraction."""
         self.extraction = self.extraction.merge(new_extraction)
     
+    @property
+    def full_transcript_len(self) -> int:
+        """Length of the full transcript, without building or copying it."""
+        return self._total_chars
+
+    def get_transcript_since(self, offset: int) -> str:
+        """Transcript text after absolute char `offset`, limited to the rolling window.
+
+        If part of that range has already scrolled out of the window, only the
+        retained part is returned.
+        """
+        if self._window_text is None:
+            self._window_text = "".join(self._window)
+        start = max(offset - self._window_start, 0)
+        return self._window_text[start:].lstrip("\n")
+
     def get_full_transcript(self) -> str:
         """Get the full transcript with clear speaker boundaries.
 
         Returns newline-separated lines like:
             Doctor: Good morning, how are you?
             Patient: I have a headache for 3 days.
+
+        Built on demand: it is only needed when the session is archived, and
+        the per-chunk extraction path reads the rolling window instead.
         """
         return "\n".join(
             f"{chunk.speaker}: {chunk.text}" for chunk in self.transcript_chunks
@@ -1,5 +1,5 @@
 from typing import Literal, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel
 from .patient import Patient
 from .extraction import ExtractionResult
 
@@ -12,14 +12,6 @@ class StartSessionMessage(BaseModel):
     patient: Patient
 
 
-class AudioChunkMessage(BaseModel):
-    """Message containing audio chunk data."""
-
-    type: Literal["audio_chunk"] = "audio_chunk"
-    audio_data: str = Field(..., description="Base64 encoded audio data")
-    source: Optional[str] = Field(default=None, description="Audio source: 'mic' (doctor) or 'tab' (patient)")
-
-
 class StopSessionMessage(BaseModel):
     """Message to stop the current session."""
     
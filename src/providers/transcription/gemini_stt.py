@@ -6,7 +6,7 @@ Sends audio as inline data and gets transcription via the generateContent endpoi
 No additional SDK required - uses httpx directly.
 """
 
-import base64
+import pybase64
 import logging
 import httpx
 from ..base import TranscriptionProvider, TranscriptionError
@@ -36,7 +36,7 @@ class GeminiSTTProvider(TranscriptionProvider):
             Transcribed text
         """
         try:
-            audio_b64 = base64.b64encode(audio_bytes).decode("utf-8")
+            audio_b64 = pybase64.b64encode(audio_bytes).decode("utf-8")
 
             url = f"{GEMINI_API_URL}/{self.model}:generateContent?key={self.api_key}"
 
@@ -7,7 +7,7 @@ Accepts WAV LINEAR16 directly - no format conversion needed.
 Uses httpx for HTTP requests - no additional SDK required.
 """
 
-import base64
+import pybase64
 import logging
 import httpx
 from ..base import TranscriptionProvider, TranscriptionError
@@ -45,7 +45,7 @@ class GoogleSTTProvider(TranscriptionProvider):
             else:
                 pcm_data = audio_bytes
 
-            audio_b64 = base64.b64encode(pcm_data).decode("utf-8")
+            audio_b64 = pybase64.b64encode(pcm_data).decode("utf-8")
 
             url = f"{GOOGLE_STT_API_URL}?key={self.api_key}"
 
@@ -97,5 +97,9 @@ class ExtractionService:
         patient: Patient,
         previous_extraction: Optional[ExtractionResult] = None
     ) -> ExtractionResult:
-        """Extract structured clinical data from transcript."""
+        """Extract structured clinical data from transcript.
+
+        `transcript` may be only the new text since `previous_extraction`;
+        providers merge new information into the previous result.
+        """
         return await self.provider.extract(transcript, patient, previous_extraction)
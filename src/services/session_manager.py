@@ -1,16 +1,60 @@
 import logging
-from typing import Dict, Optional
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Optional
 from ..models.consultation import ConsultationSession
+from ..models.patient import Patient
 
 logger = logging.getLogger(__name__)
 
 
 class SessionManager:
     """In-memory session management."""
+
+    # Max finished sessions kept around for reuse
+    _FREE_LIST_SIZE = 64
     
     def __init__(self):
         self.sessions: Dict[str, ConsultationSession] = {}
+        self._free_sessions: Deque[ConsultationSession] = deque(maxlen=self._FREE_LIST_SIZE)
         logger.info("Session manager initialized")
+
+    def acquire_session(
+        self,
+        session_id: str,
+        patient: Patient,
+        appointment_id: Optional[str] = None
+    ) -> ConsultationSession:
+        """Create and register a session, reusing a released one if available."""
+        if self._free_sessions:
+            # Already reset on release
+            session = self._free_sessions.pop()
+            session.session_id = session_id
+            session.patient = patient
+            session.appointment_id = appointment_id
+            session.started_at = datetime.utcnow()
+        else:
+            session = ConsultationSession(
+                session_id=session_id,
+                patient=patient,
+                appointment_id=appointment_id
+            )
+        return self.create_session(session)
+
+    def release_session(self, session: ConsultationSession) -> None:
+        """Return an ended session for reuse.
+
+        Only call once nothing else holds the session (after final
+        extraction and audio save have finished). The session is reset here
+        so pooled objects don't keep transcripts or extraction data alive;
+        `patient` is a required field and is only overwritten on acquire.
+        """
+        if session.session_id in self.sessions:
+            logger.warning(f"Refusing to release active session: {session.session_id}")
+            return
+        session.reset()
+        session.appointment_id = None
+        self._free_sessions.append(session)
     
     def create_session(self, session: ConsultationSession) -> ConsultationSession:
         """Create a new session."""
@@ -24,8 +68,8 @@ class SessionManager:
     
     def end_session(self, session_id: str) -> None:
         """End and remove a session."""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        # Single pop instead of check-then-delete, so a racing end is a no-op
+        if self.sessions.pop(session_id, None) is not None:
             logger.info(f"Ended session: {session_id}")
     
     def get_active_sessions_count(self) -> int:
@@ -3,6 +3,7 @@ Embedding generation for medical text using sentence transformers.
 """
 
 import asyncio
+import functools
 import logging
 import numpy as np
 from typing import Union, List
@@ -11,6 +12,14 @@ from sentence_transformers import SentenceTransformer
 from ...config.settings import Config
 
 
+@functools.lru_cache(maxsize=4)
+def _load_sentence_transformer(model_name: str, backend: str) -> SentenceTransformer:
+    """Load a model once per process; every EmbeddingGenerator shares the weights."""
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    return SentenceTransformer(model_name, backend=backend)
+
+
 class EmbeddingGenerator:
     """Generate embeddings for medical text using sentence transformers."""
     
@@ -21,9 +30,22 @@ class EmbeddingGenerator:
     
     def _load_model(self):
         """Load the sentence transformer model."""
+        model_name = self.config.vector_db.embedding_model
+        backend = getattr(self.config.vector_db, "embedding_backend", "torch")
         try:
-            self.model = SentenceTransformer(self.config.vector_db.embedding_model)
-            self.logger.info(f"Loaded embedding model: {self.config.vector_db.embedding_model}")
+            if backend == "onnx":
+                try:
+                    # Runs the model through ONNX Runtime (exported on first load if the
+                    # model repo has no ONNX file). Vectors differ slightly from torch's,
+                    # so a collection should not mix embeddings from both backends.
+                    self.model = _load_sentence_transformer(model_name, "onnx")
+                except Exception as e:
+                    self.logger.warning(f"ONNX backend unavailable, falling back to torch: {str(e)}")
+                    backend = "torch"
+                    self.model = _load_sentence_transformer(model_name, backend)
+            else:
+                self.model = _load_sentence_transformer(model_name, backend)
+            self.logger.info(f"Loaded embedding model: {model_name} (backend: {backend})")
         except Exception as e:
             self.logger.error(f"Failed to load embedding model: {str(e)}")
             raise
@@ -55,14 +77,10 @@ class EmbeddingGenerator:
     async def generate_batch_embeddings(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
         """Generate embeddings for a batch of texts."""
         try:
-            all_embeddings = []
-            
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
-                batch_embeddings = await self.generate_embedding(batch)
-                all_embeddings.append(batch_embeddings)
-            
-            return np.vstack(all_embeddings)
+            # A single encode call lets the model length-sort and batch internally
+            return await asyncio.to_thread(
+                self.model.encode, texts, batch_size=batch_size, convert_to_numpy=True
+            )
             
         except Exception as e:
             self.logger.error(f"Failed to generate batch embeddings: {str(e)}")
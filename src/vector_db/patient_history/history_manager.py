@@ -3,27 +3,58 @@ Patient history management using vector database for semantic search and context
 """
 
 import asyncio
+import bisect
+import heapq
 import logging
-import json
-from typing import Dict, Any, List, Optional
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 from pathlib import Path
 
+import numpy as np
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 
 from ...config.settings import Config
 from ..embeddings.embedding_generator import EmbeddingGenerator
 from ..search.semantic_search import SemanticSearchEngine
 
 
+# (label, medical_data key, text key for dict entries) for list-valued sections
+_LIST_SECTIONS = (
+    ('Symptoms', 'symptoms', None),
+    ('Diagnosis', 'diagnosis', None),
+    ('Medications', 'medications', 'text'),
+    ('Procedures', 'procedures', 'context'),
+)
+
+_CHRONIC_KEYWORDS = (
+    'diabetes', 'hypertension', 'asthma', 'copd', 'arthritis',
+    'depression', 'anxiety', 'heart disease', 'chronic'
+)
+_ALLERGY_KEYWORDS = ('allergic to', 'allergy', 'allergies', 'adverse reaction')
+
+# Lookahead alternation reports every keyword occurrence, including overlapping ones
+_CHRONIC_PATTERN = re.compile('(?=(' + '|'.join(map(re.escape, _CHRONIC_KEYWORDS)) + '))')
+_ALLERGY_PATTERN = re.compile('|'.join(map(re.escape, _ALLERGY_KEYWORDS)))
+_RECORD_SEPARATOR = '\x1f'
+
+
 class PatientHistoryManager:
     """Manages patient medical history using vector database for semantic search."""
     
+    # Liveness probes hit health_check every few seconds; reuse the last
+    # result for this long instead of round-tripping to Chroma each time.
+    _HEALTH_CHECK_TTL_SECS = 30
+    
     def __init__(self, config: Config):
         self.config = config
         self.logger = logging.getLogger(__name__)
+        self._last_health = (float('-inf'), "unhealthy")  # (monotonic time, status)
         
         # Initialize vector database client
         self._initialize_vector_db()
@@ -59,6 +90,19 @@ class PatientHistoryManager:
                 )
                 
                 self.logger.info(f"ChromaDB initialized with collection: {self.config.vector_db.collection_name}")
+                
+                # Secondary (patient_id, timestamp) index so history lookups
+                # avoid a metadata scan of the collection
+                self._history_index = sqlite3.connect(
+                    str(persist_dir / "history_idx.db"),
+                    check_same_thread=False
+                )
+                self._history_index_lock = threading.Lock()
+                self._history_index.executescript(
+                    "CREATE TABLE IF NOT EXISTS idx (patient_id TEXT, ts TEXT, rid TEXT PRIMARY KEY);"
+                    "CREATE INDEX IF NOT EXISTS idx_patient_ts ON idx (patient_id, ts DESC);"
+                )
+                self._backfill_history_index()
             
             else:
                 raise ValueError(f"Unsupported vector DB provider: {self.config.vector_db.provider}")
@@ -67,6 +111,38 @@ class PatientHistoryManager:
             self.logger.error(f"Failed to initialize vector database: {str(e)}")
             raise
     
+    def _backfill_history_index(self):
+        """Populate the history index from records stored before it existed."""
+        if self._history_index.execute("SELECT 1 FROM idx LIMIT 1").fetchone():
+            return
+        if not self.collection.count():
+            return
+        
+        existing = self.collection.get(include=['metadatas'])
+        rows = [
+            (metadata.get('patient_id'), metadata.get('timestamp'), record_id)
+            for record_id, metadata in zip(existing['ids'], existing['metadatas'])
+            if metadata
+        ]
+        self._index_records(rows)
+        self.logger.info(f"Backfilled patient history index with {len(rows)} records")
+    
+    def _index_records(self, rows: List[Tuple[str, str, str]]):
+        """Insert (patient_id, timestamp, record_id) rows into the history index."""
+        with self._history_index_lock, self._history_index:
+            self._history_index.executemany(
+                "INSERT OR IGNORE INTO idx VALUES (?, ?, ?)", rows
+            )
+    
+    def _lookup_history_ids(self, patient_id: str, cutoff: str, limit: int = 50) -> List[str]:
+        """Return a patient's record IDs since ``cutoff``, most recent first."""
+        with self._history_index_lock:
+            cursor = self._history_index.execute(
+                "SELECT rid FROM idx WHERE patient_id = ? AND ts >= ? ORDER BY ts DESC LIMIT ?",
+                (patient_id, cutoff, limit)
+            )
+            return [row[0] for row in cursor.fetchall()]
+    
     async def store_patient_record(
         self, 
         patient_id: str, 
@@ -84,50 +160,103 @@ class PatientHistoryManager:
         Returns:
             Record ID for the stored document
         """
-        try:
-            # Create document ID
-            timestamp = datetime.now().isoformat()
-            record_id = f"{patient_id}_{timestamp}"
+        record_ids = await self.store_patient_records_batch(
+            [(patient_id, medical_data, transcript_text)]
+        )
+        return record_ids[0]
+    
+    async def store_patient_records_batch(
+        self,
+        records: List[Tuple[str, Dict[str, Any], str]]
+    ) -> List[str]:
+        """
+        Store several patient medical records with one embedding pass and one insert.
+        
+        Args:
+            records: (patient_id, medical_data, transcript_text) tuples
             
-            # Prepare document content for embedding
-            document_content = self._prepare_document_content(medical_data, transcript_text)
+        Returns:
+            Record IDs for the stored documents, in input order
+        """
+        if not records:
+            return []
+        
+        try:
+            patient_ids = [record[0] for record in records]
+            medical_datas = [record[1] for record in records]
+            transcripts = [record[2] for record in records]
             
-            # Generate embeddings
-            embedding = await self.embedding_generator.generate_embedding(document_content)
+            # Prepare document content off the event loop
+            documents = await asyncio.to_thread(
+                list, map(self._prepare_document_content, medical_datas, transcripts)
+            )
             
-            # Prepare metadata
-            metadata = {
-                'patient_id': patient_id,
-                'timestamp': timestamp,
-                'record_type': 'consultation',
-                'has_diagnosis': len(medical_data.get('diagnosis', [])) > 0,
-                'has_medications': len(medical_data.get('medications', [])) > 0,
-                'has_procedures': len(medical_data.get('procedures', [])) > 0,
-                'word_count': medical_data.get('transcript_metadata', {}).get('word_count', 0),
-                'confidence_score': medical_data.get('confidence_scores', {}).get('overall', 0.0)
-            }
+            # Generate all embeddings in a single encode call
+            embeddings = await self.embedding_generator.generate_batch_embeddings(
+                documents, batch_size=64
+            )
             
-            # Add ICD codes to metadata if present
-            if medical_data.get('icd_codes'):
-                metadata['icd_codes'] = json.dumps(medical_data['icd_codes'])
+            # Create document IDs and metadata
+            record_ids = []
+            timestamps = []
+            metadatas = []
+            for patient_id, medical_data in zip(patient_ids, medical_datas):
+                created_at = datetime.now()
+                timestamp = created_at.isoformat()
+                # Random suffix: records in one batch can share a microsecond timestamp
+                record_ids.append(f"{patient_id}_{timestamp}_{uuid.uuid4().hex[:8]}")
+                timestamps.append(timestamp)
+                metadatas.append(self._build_metadata(patient_id, created_at, medical_data))
             
             # Store in vector database
             await asyncio.to_thread(
                 self.collection.add,
-                ids=[record_id],
-                embeddings=[embedding.tolist()],
-                documents=[document_content],
-                metadatas=[metadata]
+                ids=record_ids,
+                embeddings=np.asarray(embeddings, dtype=np.float32),
+                documents=documents,
+                metadatas=metadatas
+            )
+            await asyncio.to_thread(
+                self._index_records, list(zip(patient_ids, timestamps, record_ids))
             )
+            self.search_engine.add_to_index(patient_ids, record_ids, embeddings)
             
-            self.logger.info(f"Stored medical record for patient {patient_id}: {record_id}")
+            self.logger.info(f"Stored {len(record_ids)} medical record(s): {', '.join(record_ids)}")
             
-            return record_id
+            return record_ids
             
         except Exception as e:
-            self.logger.error(f"Failed to store patient record for {patient_id}: {str(e)}")
+            self.logger.error(f"Failed to store {len(records)} patient record(s): {str(e)}")
             raise
     
+    @staticmethod
+    def _build_metadata(patient_id: str, created_at: datetime, medical_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the Chroma metadata for a stored record."""
+        metadata = {
+            'patient_id': patient_id,
+            'timestamp': created_at.isoformat(),
+            'ts_epoch': created_at.timestamp(),
+            'record_type': 'consultation',
+            'has_diagnosis': len(medical_data.get('diagnosis', [])) > 0,
+            'has_medications': len(medical_data.get('medications', [])) > 0,
+            'has_procedures': len(medical_data.get('procedures', [])) > 0,
+            'word_count': medical_data.get('transcript_metadata', {}).get('word_count', 0),
+            'confidence_score': medical_data.get('confidence_scores', {}).get('overall', 0.0)
+        }
+        
+        # Add ICD codes to metadata if present, flattened to a space-separated
+        # code list (ICD-10 codes contain no whitespace); codes arrive sorted
+        # by confidence, so the first is the primary code
+        if medical_data.get('icd_codes'):
+            codes = [
+                code['icd_code'] if isinstance(code, dict) else str(code)
+                for code in medical_data['icd_codes']
+            ]
+            metadata['icd_codes'] = ' '.join(codes)
+            metadata['icd_primary'] = codes[0]
+        
+        return metadata
+    
     async def get_patient_context(
         self, 
         patient_id: str, 
@@ -172,11 +301,15 @@ class PatientHistoryManager:
             # Extract allergy information
             allergies = self._extract_allergies(patient_history)
             
+            # Recency / medication counts shared by summary and risk factors
+            history_stats = self._compute_history_stats(patient_history)
+            
             # Generate patient summary
             patient_summary = self._generate_patient_summary(
                 patient_history, 
                 medication_history, 
-                chronic_conditions
+                chronic_conditions,
+                history_stats
             )
             
             context = {
@@ -185,12 +318,14 @@ class PatientHistoryManager:
                 'history_period_months': max_history_months,
                 'total_consultations': len(patient_history),
                 'patient_summary': patient_summary,
-                'recent_consultations': patient_history[:3],  # Most recent 3
+                'recent_consultations': heapq.nlargest(
+                    3, patient_history, key=lambda x: x['ts_epoch']
+                ),  # Most recent 3
                 'similar_consultations': similar_consultations,
                 'medication_history': medication_history,
                 'chronic_conditions': chronic_conditions,
                 'known_allergies': allergies,
-                'risk_factors': self._identify_risk_factors(patient_history)
+                'risk_factors': self._identify_risk_factors(history_stats)
             }
             
             self.logger.info(f"Retrieved context for patient {patient_id}: {len(patient_history)} records")
@@ -229,40 +364,21 @@ class PatientHistoryManager:
         if medical_data.get('clinical_summary'):
             content_parts.append(f"Summary: {medical_data['clinical_summary']}")
         
-        # Add symptoms
-        if medical_data.get('symptoms'):
-            symptoms_text = "; ".join(medical_data['symptoms'])
-            content_parts.append(f"Symptoms: {symptoms_text}")
-        
-        # Add diagnosis
-        if medical_data.get('diagnosis'):
-            diagnosis_text = "; ".join(medical_data['diagnosis'])
-            content_parts.append(f"Diagnosis: {diagnosis_text}")
-        
-        # Add medications
-        if medical_data.get('medications'):
-            medication_texts = []
-            for med in medical_data['medications']:
-                if isinstance(med, dict):
-                    medication_texts.append(med.get('text', str(med)))
-                else:
-                    medication_texts.append(str(med))
-            content_parts.append(f"Medications: {'; '.join(medication_texts)}")
-        
-        # Add procedures
-        if medical_data.get('procedures'):
-            procedure_texts = []
-            for proc in medical_data['procedures']:
-                if isinstance(proc, dict):
-                    procedure_texts.append(proc.get('context', str(proc)))
-                else:
-                    procedure_texts.append(str(proc))
-            content_parts.append(f"Procedures: {'; '.join(procedure_texts)}")
+        # Add list sections (symptoms, diagnosis, medications, procedures)
+        for label, field, item_key in _LIST_SECTIONS:
+            items = medical_data.get(field)
+            if not items:
+                continue
+            if item_key is None:
+                section_text = "; ".join(items)
+            else:
+                section_text = "; ".join(self._format_items(items, item_key))
+            content_parts.append(f"{label}: {section_text}")
         
         # Add follow-up instructions
-        if medical_data.get('follow_up_instructions', {}).get('instructions'):
-            follow_up_text = "; ".join(medical_data['follow_up_instructions']['instructions'])
-            content_parts.append(f"Follow-up: {follow_up_text}")
+        follow_up = medical_data.get('follow_up_instructions', {}).get('instructions')
+        if follow_up:
+            content_parts.append(f"Follow-up: {'; '.join(follow_up)}")
         
         # Combine all content
         document_content = " | ".join(content_parts)
@@ -273,32 +389,46 @@ class PatientHistoryManager:
         
         return document_content
     
+    @staticmethod
+    def _format_items(items: List[Any], key: str) -> List[str]:
+        """Render list entries as text, using ``key`` for dict entries."""
+        # str(item) is only built when the key is missing (dict.get would build it eagerly)
+        return [
+            (item[key] if key in item else str(item)) if isinstance(item, dict) else str(item)
+            for item in items
+        ]
+    
     async def _get_patient_history(self, patient_id: str, cutoff_date: datetime) -> List[Dict[str, Any]]:
         """Get patient's historical records."""
         try:
-            # Query vector database for patient records
+            # Resolve record IDs from the (patient_id, timestamp) index
+            record_ids = await asyncio.to_thread(
+                self._lookup_history_ids, patient_id, cutoff_date.isoformat()
+            )
+            if not record_ids:
+                return []
+            
             results = await asyncio.to_thread(
-                self.collection.query,
-                where={
-                    "patient_id": patient_id,
-                    "timestamp": {"$gte": cutoff_date.isoformat()}
-                },
-                n_results=50  # Limit to recent records
+                self.collection.get,
+                ids=record_ids,
+                include=['documents', 'metadatas']
             )
             
-            # Process results
+            # Keep the index's most-recent-first order without re-sorting
+            positions = {record_id: i for i, record_id in enumerate(results['ids'])}
             history = []
-            if results['ids']:
-                for i, record_id in enumerate(results['ids'][0]):
-                    history.append({
-                        'id': record_id,
-                        'content': results['documents'][0][i],
-                        'metadata': results['metadatas'][0][i],
-                        'timestamp': results['metadatas'][0][i].get('timestamp')
-                    })
-            
-            # Sort by timestamp (most recent first)
-            history.sort(key=lambda x: x['timestamp'], reverse=True)
+            for record_id in record_ids:
+                i = positions.get(record_id)
+                if i is None:
+                    continue
+                metadata = results['metadatas'][i]
+                history.append({
+                    'id': record_id,
+                    'content': results['documents'][i],
+                    'metadata': metadata,
+                    'timestamp': metadata.get('timestamp'),
+                    'ts_epoch': self._timestamp_epoch(metadata)
+                })
             
             return history
             
@@ -306,6 +436,15 @@ class PatientHistoryManager:
             self.logger.error(f"Failed to get patient history for {patient_id}: {str(e)}")
             return []
     
+    @staticmethod
+    def _timestamp_epoch(metadata: Dict[str, Any]) -> float:
+        """Record time as epoch seconds (parsed from the ISO timestamp for older records)."""
+        if metadata.get('ts_epoch') is not None:
+            return metadata['ts_epoch']
+        if metadata.get('timestamp'):
+            return datetime.fromisoformat(metadata['timestamp']).timestamp()
+        return 0.0
+    
     def _create_search_query(self, medical_data: Dict[str, Any]) -> str:
         """Create search query from current medical data."""
         query_parts = []
@@ -339,39 +478,62 @@ class PatientHistoryManager:
     
     def _extract_chronic_conditions(self, patient_history: List[Dict[str, Any]]) -> List[str]:
         """Extract chronic conditions from patient history."""
-        chronic_keywords = [
-            'diabetes', 'hypertension', 'asthma', 'copd', 'arthritis',
-            'depression', 'anxiety', 'heart disease', 'chronic'
-        ]
-        
-        conditions = set()
-        
-        for record in patient_history:
-            content = record.get('content', '').lower()
-            for keyword in chronic_keywords:
-                if keyword in content:
-                    conditions.add(keyword.title())
+        # One regex pass over all records; separator keeps matches within a record
+        blob = _RECORD_SEPARATOR.join(
+            (record.get('content') or '').lower() for record in patient_history
+        )
+        conditions = {match.group(1).title() for match in _CHRONIC_PATTERN.finditer(blob)}
         
         return list(conditions)
     
     def _extract_allergies(self, patient_history: List[Dict[str, Any]]) -> List[str]:
         """Extract known allergies from patient history."""
-        allergies = []
-        allergy_keywords = ['allergic to', 'allergy', 'allergies', 'adverse reaction']
+        contents = [(record.get('content') or '').lower() for record in patient_history]
+        blob = _RECORD_SEPARATOR.join(contents)
+        
+        # Start offset of each record in the joined blob, to map hits back to records
+        starts = []
+        offset = 0
+        for content in contents:
+            starts.append(offset)
+            offset += len(content) + 1
+        mentioned = {
+            bisect.bisect_right(starts, match.start()) - 1
+            for match in _ALLERGY_PATTERN.finditer(blob)
+        }
         
-        for record in patient_history:
-            content = record.get('content', '').lower()
-            if any(keyword in content for keyword in allergy_keywords):
+        allergies = []
+        for i, record in enumerate(patient_history):
+            if i in mentioned:
                 # Simple extraction - in production, use more sophisticated NLP
                 allergies.append(f"Mentioned in consultation on {record.get('metadata', {}).get('timestamp', 'unknown date')}")
         
         return allergies[:5]  # Return recent 5
     
+    @staticmethod
+    def _compute_history_stats(patient_history: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Count recent and medication-bearing records with vectorized reductions."""
+        count = len(patient_history)
+        ts = np.fromiter((r['ts_epoch'] for r in patient_history), dtype=np.float64, count=count)
+        has_meds = np.fromiter(
+            (bool(r.get('metadata', {}).get('has_medications')) for r in patient_history),
+            dtype=np.bool_,
+            count=count
+        )
+        
+        now = time.time()
+        return {
+            'recent_30d': int(np.count_nonzero(ts > now - 30 * 86400)),
+            'recent_90d': int(np.count_nonzero(ts > now - 90 * 86400)),
+            'medication_records': int(np.count_nonzero(has_meds))
+        }
+    
     def _generate_patient_summary(
         self, 
         patient_history: List[Dict[str, Any]], 
         medication_history: List[Dict[str, Any]], 
-        chronic_conditions: List[str]
+        chronic_conditions: List[str],
+        history_stats: Dict[str, int]
     ) -> str:
         """Generate a concise patient summary."""
         summary_parts = []
@@ -390,43 +552,37 @@ class PatientHistoryManager:
             summary_parts.append(f"Recent medications documented in {len(medication_history)} consultations")
         
         # Recent consultation frequency
-        if consultation_count > 1:
-            recent_consultations = [
-                r for r in patient_history 
-                if r.get('metadata', {}).get('timestamp') and 
-                datetime.fromisoformat(r['metadata']['timestamp']) > datetime.now() - timedelta(days=90)
-            ]
-            if recent_consultations:
-                summary_parts.append(f"{len(recent_consultations)} consultations in last 90 days")
+        if consultation_count > 1 and history_stats['recent_90d']:
+            summary_parts.append(f"{history_stats['recent_90d']} consultations in last 90 days")
         
         return ". ".join(summary_parts) + "." if summary_parts else "No significant medical history available."
     
-    def _identify_risk_factors(self, patient_history: List[Dict[str, Any]]) -> List[str]:
+    def _identify_risk_factors(self, history_stats: Dict[str, int]) -> List[str]:
         """Identify potential risk factors from patient history."""
         risk_factors = []
         
         # High consultation frequency
-        recent_count = len([
-            r for r in patient_history 
-            if r.get('metadata', {}).get('timestamp') and 
-            datetime.fromisoformat(r['metadata']['timestamp']) > datetime.now() - timedelta(days=30)
-        ])
-        
-        if recent_count >= 3:
+        if history_stats['recent_30d'] >= 3:
             risk_factors.append("High consultation frequency (3+ in last 30 days)")
         
         # Multiple medications
-        medication_records = [r for r in patient_history if r.get('metadata', {}).get('has_medications')]
-        if len(medication_records) >= 5:
+        if history_stats['medication_records'] >= 5:
             risk_factors.append("Multiple medication prescriptions")
         
         return risk_factors
     
     async def health_check(self) -> str:
-        """Check vector database health."""
+        """Check vector database health (cached for _HEALTH_CHECK_TTL_SECS)."""
+        checked_at, status = self._last_health
+        if time.monotonic() - checked_at < self._HEALTH_CHECK_TTL_SECS:
+            return status
+        
         try:
             # Simple query to test connectivity
             await asyncio.to_thread(self.collection.count)
-            return "healthy"
+            status = "healthy"
         except Exception:
-            return "unhealthy"
\ No newline at end of file
+            status = "unhealthy"
+        
+        self._last_health = (time.monotonic(), status)
+        return status
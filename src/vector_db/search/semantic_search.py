@@ -4,7 +4,9 @@ Semantic search engine for patient medical history using vector database.
 
 import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 import numpy as np
 
 from ...config.settings import Config
@@ -14,12 +16,164 @@ from ..embeddings.embedding_generator import EmbeddingGenerator
 class SemanticSearchEngine:
     """Semantic search engine for medical records using vector similarity."""
     
+    # Patient-scoped searches over at most this many records are answered from
+    # an in-process float16 copy of the patient's vectors instead of Chroma.
+    _FAST_PATH_MAX_VECTORS = 2048
+    
+    # LRU bound on the patient vector sets kept in memory, in total vectors
+    # (~25 MB of float16 at 384 dims); empty and too-large entries count as one
+    _PATIENT_CACHE_MAX_VECTORS = 32768
+    
+    # Exact-match tier: recent (normalized query, filters) -> formatted results
+    _EXACT_CACHE_SIZE = 1024
+    
     def __init__(self, config: Config, vector_client, collection):
         self.config = config
         self.logger = logging.getLogger(__name__)
         self.vector_client = vector_client
         self.collection = collection
         self.embedding_generator = EmbeddingGenerator(config)
+        # patient_id -> (record ids, float16 vectors, float32 squared norms); None = too large
+        self._patient_vectors: OrderedDict = OrderedDict()
+        self._patient_cache_vectors = 0
+        # Versions are only tracked for patients that are cached or being loaded,
+        # and drawn from one counter so a dropped entry can never be re-matched
+        self._patient_versions: Dict[str, int] = {}
+        self._patient_loads: Dict[str, int] = {}
+        self._next_version = 0
+        self._exact_cache: OrderedDict = OrderedDict()
+        self._exact_cache_generation = 0
+    
+    def add_to_index(self, patient_ids: List[str], record_ids: List[str], embeddings: np.ndarray):
+        """Append newly stored records to any loaded patient vector sets."""
+        # New records can change any cached result
+        self._exact_cache.clear()
+        self._exact_cache_generation += 1
+        
+        embeddings = np.asarray(embeddings)
+        for i, (patient_id, record_id) in enumerate(zip(patient_ids, record_ids)):
+            if patient_id not in self._patient_versions:
+                continue  # Neither cached nor loading
+            # Invalidates in-flight loads that may have missed this record
+            self._next_version += 1
+            self._patient_versions[patient_id] = self._next_version
+            
+            cached = self._patient_vectors.get(patient_id)
+            if cached is None:
+                continue
+            ids, vectors, sq_norms = cached
+            if len(ids) >= self._FAST_PATH_MAX_VECTORS:
+                self._cache_patient_vectors(patient_id, None)
+                continue
+            vector = embeddings[i].astype(np.float16).reshape(1, -1)
+            self._cache_patient_vectors(patient_id, (
+                ids + [record_id],
+                np.vstack([vectors, vector]) if ids else vector,
+                np.append(sq_norms, self._squared_norms(vector))
+            ))
+    
+    async def _get_patient_vectors(self, patient_id: str) -> Optional[Tuple[List[str], np.ndarray, np.ndarray]]:
+        """Return the patient's float16 vector set, loading it from Chroma on first use."""
+        if patient_id in self._patient_vectors:
+            self._patient_vectors.move_to_end(patient_id)
+            return self._patient_vectors[patient_id]
+        
+        if patient_id not in self._patient_versions:
+            self._next_version += 1
+            self._patient_versions[patient_id] = self._next_version
+        version = self._patient_versions[patient_id]
+        self._patient_loads[patient_id] = self._patient_loads.get(patient_id, 0) + 1
+        try:
+            records = await asyncio.to_thread(
+                self.collection.get,
+                where={"patient_id": patient_id},
+                include=['embeddings']
+            )
+        finally:
+            self._patient_loads[patient_id] -= 1
+            if not self._patient_loads[patient_id]:
+                del self._patient_loads[patient_id]
+        
+        if not records['ids']:
+            # No records yet: cache an empty set so Chroma isn't queried again
+            entry = ([], np.empty((0, 0), dtype=np.float16), np.empty(0, dtype=np.float32))
+        elif len(records['ids']) > self._FAST_PATH_MAX_VECTORS:
+            entry = None
+        else:
+            vectors = np.asarray(records['embeddings'], dtype=np.float16).reshape(len(records['ids']), -1)
+            entry = (list(records['ids']), vectors, self._squared_norms(vectors))
+        
+        # Only cache if no record was added for this patient while loading
+        if self._patient_versions.get(patient_id) == version:
+            self._cache_patient_vectors(patient_id, entry)
+        self._forget_patient_version(patient_id)
+        return entry
+    
+    def _cache_patient_vectors(self, patient_id: str, entry: Optional[Tuple[List[str], np.ndarray, np.ndarray]]):
+        """Store a patient's vector set as most recently used, evicting the oldest over the cap."""
+        if patient_id in self._patient_vectors:
+            self._patient_cache_vectors -= self._entry_size(self._patient_vectors.pop(patient_id))
+        self._patient_vectors[patient_id] = entry
+        self._patient_cache_vectors += self._entry_size(entry)
+        
+        while self._patient_cache_vectors > self._PATIENT_CACHE_MAX_VECTORS and len(self._patient_vectors) > 1:
+            evicted_id, evicted = self._patient_vectors.popitem(last=False)
+            self._patient_cache_vectors -= self._entry_size(evicted)
+            self._forget_patient_version(evicted_id)
+    
+    def _forget_patient_version(self, patient_id: str):
+        """Drop the version of a patient that is neither cached nor loading."""
+        if patient_id not in self._patient_vectors and patient_id not in self._patient_loads:
+            self._patient_versions.pop(patient_id, None)
+    
+    @staticmethod
+    def _entry_size(entry: Optional[Tuple[List[str], np.ndarray, np.ndarray]]) -> int:
+        """Vectors an entry counts against the cache cap (at least one)."""
+        return max(len(entry[0]), 1) if entry is not None else 1
+    
+    @staticmethod
+    def _squared_norms(vectors: np.ndarray) -> np.ndarray:
+        """Row-wise squared L2 norms, accumulated in float32."""
+        vectors = vectors.astype(np.float32)
+        return np.einsum('ij,ij->i', vectors, vectors)
+    
+    async def _search_patient_vectors(
+        self,
+        patient_vectors: Tuple[List[str], np.ndarray, np.ndarray],
+        query_embedding: np.ndarray,
+        n_results: int
+    ) -> Tuple[List[str], List[str], List[Dict[str, Any]], List[float]]:
+        """Exact search over one patient's float16 vectors, using Chroma's squared-L2 distance."""
+        ids, vectors, sq_norms = patient_vectors
+        if not ids:
+            return [], [], [], []
+        
+        query = query_embedding.astype(np.float32).reshape(-1)
+        distances = sq_norms - 2.0 * (vectors.astype(np.float32) @ query) + float(query @ query)
+        
+        n_results = min(n_results, len(ids))
+        top = np.argpartition(distances, n_results - 1)[:n_results]
+        top = top[np.argsort(distances[top])]
+        top_ids = [ids[i] for i in top]
+        
+        records = await asyncio.to_thread(
+            self.collection.get,
+            ids=top_ids,
+            include=['documents', 'metadatas']
+        )
+        positions = {record_id: i for i, record_id in enumerate(records['ids'])}
+        
+        result_ids, documents, metadatas, result_distances = [], [], [], []
+        for record_id, index in zip(top_ids, top):
+            i = positions.get(record_id)
+            if i is None:
+                continue
+            result_ids.append(record_id)
+            documents.append(records['documents'][i])
+            metadatas.append(records['metadatas'][i])
+            result_distances.append(float(distances[index]))
+        
+        return result_ids, documents, metadatas, result_distances
     
     async def semantic_search(
         self, 
@@ -46,44 +200,70 @@ class SemanticSearchEngine:
             
             max_results = max_results or self.config.vector_db.max_results
             
+            # Exact-match cache: repeated programmatic queries skip embedding + search
+            cache_key = (query.strip().lower(), patient_id or '', max_results, round(similarity_threshold, 2))
+            cached = self._exact_cache.get(cache_key)
+            if cached is not None:
+                self._exact_cache.move_to_end(cache_key)
+                return list(cached)
+            cache_generation = self._exact_cache_generation
+            
             # Generate query embedding
             query_embedding = await self.embedding_generator.generate_embedding(query)
             
-            # Prepare search filters
-            where_filter = {}
-            if patient_id:
-                where_filter['patient_id'] = patient_id
-            
-            # Perform vector search
-            search_results = await asyncio.to_thread(
-                self.collection.query,
-                query_embeddings=[query_embedding.tolist()],
-                n_results=max_results,
-                where=where_filter if where_filter else None
-            )
+            patient_vectors = await self._get_patient_vectors(patient_id) if patient_id else None
+            
+            if patient_vectors is not None:
+                # Small patient-scoped search: answer from the float16 vector set
+                ids, documents, metadatas, distances = await self._search_patient_vectors(
+                    patient_vectors, query_embedding, max_results
+                )
+            else:
+                # Prepare search filters
+                where_filter = {}
+                if patient_id:
+                    where_filter['patient_id'] = patient_id
+                
+                # Perform vector search
+                search_results = await asyncio.to_thread(
+                    self.collection.query,
+                    query_embeddings=query_embedding.reshape(1, -1).astype(np.float32, copy=False),
+                    n_results=max_results,
+                    where=where_filter if where_filter else None,
+                    include=['documents', 'metadatas', 'distances']
+                )
+                ids = search_results['ids'][0] if search_results['ids'] else []
+                documents = search_results['documents'][0] if ids else []
+                metadatas = search_results['metadatas'][0] if ids else []
+                distances = search_results['distances'][0] if ids else []
             
             # Process and format results
             formatted_results = []
-            if search_results['ids'] and search_results['ids'][0]:
-                for i, result_id in enumerate(search_results['ids'][0]):
-                    similarity_score = 1 - search_results['distances'][0][i]  # Convert distance to similarity
-                    
-                    if similarity_score >= similarity_threshold:
-                        result = {
-                            'id': result_id,
-                            'content': search_results['documents'][0][i],
-                            'metadata': search_results['metadatas'][0][i],
-                            'similarity_score': similarity_score,
-                            'query': query
-                        }
-                        formatted_results.append(result)
+            for i, result_id in enumerate(ids):
+                similarity_score = 1 - distances[i]  # Convert distance to similarity
+                
+                if similarity_score >= similarity_threshold:
+                    result = {
+                        'id': result_id,
+                        'content': documents[i],
+                        'metadata': metadatas[i],
+                        'similarity_score': similarity_score,
+                        'query': query
+                    }
+                    formatted_results.append(result)
             
             # Sort by similarity score
             formatted_results.sort(key=lambda x: x['similarity_score'], reverse=True)
             
+            # Skip caching if records were added while this search ran
+            if cache_generation == self._exact_cache_generation:
+                self._exact_cache[cache_key] = formatted_results
+                if len(self._exact_cache) > self._EXACT_CACHE_SIZE:
+                    self._exact_cache.popitem(last=False)
+            
             self.logger.info(f"Semantic search returned {len(formatted_results)} results for query: '{query[:50]}...'")
             
-            return formatted_results
+            return list(formatted_results)
             
         except Exception as e:
             self.logger.error(f"Semantic search failed: {str(e)}")
@@ -198,30 +378,38 @@ class SemanticSearchEngine:
                 
                 search_results = await asyncio.to_thread(
                     self.collection.query,
-                    query_embeddings=[query_embedding.tolist()],
+                    query_embeddings=query_embedding.reshape(1, -1).astype(np.float32, copy=False),
                     n_results=50,  # Get more results for date filtering
-                    where=where_filter
+                    where=where_filter,
+                    include=['documents', 'metadatas', 'distances']
                 )
+                ids = search_results['ids'][0] if search_results['ids'] else []
+                documents = search_results['documents'][0] if ids else []
+                metadatas = search_results['metadatas'][0] if ids else []
+                distances = search_results['distances'][0] if ids else []
             else:
-                # Just retrieve records in date range
+                # Just retrieve records in date range (metadata filter, no embedding or ANN search)
                 search_results = await asyncio.to_thread(
-                    self.collection.query,
-                    query_texts=[""],  # Empty query to get all matching metadata
-                    n_results=100,
-                    where=where_filter
+                    self.collection.get,
+                    where=where_filter,
+                    limit=100,
+                    include=['documents', 'metadatas']
                 )
+                ids = search_results['ids']
+                documents = search_results['documents']
+                metadatas = search_results['metadatas']
+                distances = None
             
             # Format results
             formatted_results = []
-            if search_results['ids'] and search_results['ids'][0]:
-                for i, result_id in enumerate(search_results['ids'][0]):
-                    result = {
-                        'id': result_id,
-                        'content': search_results['documents'][0][i],
-                        'metadata': search_results['metadatas'][0][i],
-                        'similarity_score': 1 - search_results['distances'][0][i] if query else 1.0
-                    }
-                    formatted_results.append(result)
+            for i, result_id in enumerate(ids):
+                result = {
+                    'id': result_id,
+                    'content': documents[i],
+                    'metadata': metadatas[i],
+                    'similarity_score': 1 - distances[i] if distances else 1.0
+                }
+                formatted_results.append(result)
             
             return formatted_results
             
@@ -232,21 +420,20 @@ class SemanticSearchEngine:
     async def get_patient_summary_statistics(self, patient_id: str) -> Dict[str, Any]:
         """Get summary statistics for a patient's medical records."""
         try:
-            # Get all patient records
+            # Get all patient records (metadata filter, no embedding or ANN search)
             patient_records = await asyncio.to_thread(
-                self.collection.query,
-                query_texts=[""],
-                n_results=1000,  # Large number to get all records
-                where={"patient_id": patient_id}
+                self.collection.get,
+                where={"patient_id": patient_id},
+                include=['metadatas']
             )
             
-            if not patient_records['ids'] or not patient_records['ids'][0]:
+            if not patient_records['ids']:
                 return {'total_records': 0}
             
-            total_records = len(patient_records['ids'][0])
+            total_records = len(patient_records['ids'])
             
             # Analyze metadata
-            metadatas = patient_records['metadatas'][0]
+            metadatas = patient_records['metadatas']
             
             # Count records with different attributes
             has_diagnosis = sum(1 for m in metadatas if m.get('has_diagnosis', False))
@@ -271,7 +458,7 @@ class SemanticSearchEngine:
                 'first_record_date': timestamps[0] if timestamps else None,
                 'latest_record_date': timestamps[-1] if timestamps else None,
                 'date_range_days': (
-                    (pd.to_datetime(timestamps[-1]) - pd.to_datetime(timestamps[0])).days
+                    (datetime.fromisoformat(timestamps[-1]) - datetime.fromisoformat(timestamps[0])).days
                     if len(timestamps) > 1 else 0
                 )
             }
@@ -1,30 +1,90 @@
+import array
 import asyncio
-import json
 import logging
-import base64
+import math
+import os
 import struct
+import sys
 import time
-import uuid
-from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import Optional
+import orjson
+from asyncio_throttle import Throttler
 from fastapi import WebSocket, WebSocketDisconnect
 from .services.transcription_service import TranscriptionService
 from .services.extraction_service import ExtractionService
 from .services.session_manager import SessionManager
 from .services.audio_storage import AudioStorageService
 from .models.consultation import ConsultationSession, TranscriptChunk
+from .models.extraction import ExtractionResult
 from .models.patient import Patient
 from .models.websocket_messages import (
     StartSessionMessage,
-    AudioChunkMessage,
     StopSessionMessage,
-    ExtractionUpdateMessage,
     ErrorMessage
 )
 from .config.settings import Settings
 
 logger = logging.getLogger(__name__)
 
+# NumPy speeds up silence detection; fall back to array.array without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("numpy not available, using pure-Python silence detection")
+
+# Binary audio frames start with the JSON header length (uint32, big-endian)
+_AUDIO_FRAME_PREFIX = struct.Struct(">I")
+
+def _peak_amplitude(samples) -> int:
+    """Max |sample| of an Int16 buffer (max/min instead of abs: abs(-32768) overflows int16)."""
+    if NUMPY_AVAILABLE:
+        return max(int(samples.max()), -int(samples.min()))
+    return max(max(samples), -min(samples))
+
+
+def _sum_of_squares(samples) -> int:
+    """Sum of squared Int16 samples, accumulated without overflow."""
+    if NUMPY_AVAILABLE:
+        # int64 accumulator: an int32 sum of squares overflows after ~2 samples at full scale
+        s64 = samples.astype(np.int64)
+        return int(np.dot(s64, s64))
+    return sum(s * s for s in samples)
+
+
+# ExtractionResult fields compared when logging extraction changes
+_DIFF_FIELDS = tuple(ExtractionResult.model_fields)
+
+# Samples whose energy is checked before scanning the rest of the chunk
+_SILENCE_HEAD_SAMPLES = 1024
+
+# Constant frames, serialized once at import
+_SESSION_STOPPED_FRAME = orjson.dumps({"type": "session_stopped"}).decode()
+_EXTRACTION_UPDATE_PREFIX = b'{"type":"extraction_update","extraction":'
+_BATCH_PREFIX = b'{"type":"batch","items":['
+_CACHED_ERROR_FRAMES = {
+    message: ErrorMessage(message=message).model_dump_json()
+    for message in (
+        "No active session. Start a session first.",
+        "Session not found",
+    )
+}
+
+
+@dataclass(slots=True)
+class SessionExtractionState:
+    """Background extraction bookkeeping for one session."""
+    running: bool = False
+    pending: Optional[tuple] = None  # (session, websocket) queued while throttled/running
+    last_time: float = 0.0           # monotonic timestamp of the last extraction start
+    timer: Optional[asyncio.TimerHandle] = None
+    debounce_timer: Optional[asyncio.TimerHandle] = None  # trailing run for deferred transcript
+    task: Optional[asyncio.Task] = None  # in-flight background extraction
+
 
 class WebSocketHandler:
     """WebSocket connection handler for real-time transcription."""
@@ -33,6 +93,10 @@ class WebSocketHandler:
     # 5s keeps Groq API calls under rate limits while staying responsive.
     _EXTRACTION_THROTTLE_SECS = 5
 
+    # Max seconds to wait at server shutdown for in-flight finalization
+    # (final extraction + audio save) before the loop is torn down.
+    _SHUTDOWN_DRAIN_SECS = 30
+
     def __init__(
         self,
         settings: Settings,
@@ -46,11 +110,53 @@ class WebSocketHandler:
         self.extraction_service = extraction_service
         self.session_manager = session_manager
         self.audio_storage = audio_storage_service
-        self._extraction_running = {}   # session_id -> bool
-        self._extraction_pending = {}   # session_id -> (session, transcript, websocket)
-        self._last_extraction_time = {} # session_id -> monotonic timestamp
-        self._extraction_timer = {}     # session_id -> asyncio.TimerHandle
+        self._ext: defaultdict[str, SessionExtractionState] = defaultdict(SessionExtractionState)
+        self._out_queues = {}           # session_id -> asyncio.Queue of serialized JSON frames (bytes)
+        self._writer_tasks = {}         # session_id -> asyncio.Task draining _out_queues
+        self._chunk_queues = {}         # session_id -> asyncio.Queue of audio chunks to persist
+        self._chunk_writers = {}        # session_id -> asyncio.Task draining _chunk_queues
+        # Global token bucket across all sessions; the per-session throttle only
+        # dedups work, this caps the outbound extraction request rate
+        self._ext_throttler = Throttler(
+            rate_limit=settings.extraction.max_rps,
+            period=1.0
+        )
+        # Bounds how many sessions combine/save audio at once (each pulls all
+        # chunks into memory); extra saves wait their turn
+        self._save_sem = asyncio.Semaphore(settings.audio.max_concurrent_saves)
+        self._bg_tasks: set[asyncio.Task] = set()  # Strong refs so fire-and-forget tasks aren't GC'd
+        # Shared bounded pool for CPU-side audio work (silence detection) so it
+        # never runs on the event loop
+        self._audio_pool = ThreadPoolExecutor(
+            max_workers=settings.audio.workers,
+            thread_name_prefix="audio"
+        )
     
+    def _spawn(self, coro) -> asyncio.Task:
+        """Start a background task and hold a reference to it until it finishes.
+
+        The event loop only keeps weak references to tasks, so an unreferenced
+        task can be garbage-collected before it completes.
+        """
+        task = asyncio.create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+        return task
+
+    async def shutdown(self):
+        """Wait for in-flight background tasks, then release the audio pool.
+
+        Called from the app lifespan so a client dropping right before a
+        server stop doesn't lose its final extraction or saved audio.
+        """
+        pending = list(self._bg_tasks)
+        if pending:
+            logger.info(f"Waiting for {len(pending)} background task(s) before shutdown")
+            _, still_running = await asyncio.wait(pending, timeout=self._SHUTDOWN_DRAIN_SECS)
+            if still_running:
+                logger.warning(f"{len(still_running)} background task(s) still running at shutdown")
+        self._audio_pool.shutdown(wait=False)
+
     async def handle_connection(self, websocket: WebSocket):
         """Handle WebSocket connection lifecycle."""
         await websocket.accept()
@@ -58,53 +164,43 @@ class WebSocketHandler:
         
         try:
             while True:
-                data = await websocket.receive_text()
-                message = json.loads(data)
-                message_type = message.get("type")
-                
-                logger.debug(f"Received message type: {message_type}")
-                
-                if message_type == "start_session":
-                    current_session_id = await self._handle_start_session(
-                        websocket, message
-                    )
-                
-                elif message_type == "audio_chunk":
+                frame = await websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(frame.get("code", 1000))
+
+                # Binary frames carry audio; text frames carry JSON control messages
+                if frame.get("bytes") is not None:
                     if not current_session_id:
                         await self._send_error(
                             websocket,
                             "No active session. Start a session first."
                         )
                         continue
-                    
+
                     await self._handle_audio_chunk(
-                        websocket, current_session_id, message
+                        websocket, current_session_id, frame["bytes"]
                     )
+                    continue
+
+                message = orjson.loads(frame["text"])
+                message_type = message.get("type")
+                
+                logger.debug(f"Received message type: {message_type}")
                 
+                if message_type == "start_session":
+                    current_session_id = await self._handle_start_session(
+                        websocket, message
+                    )
+
                 elif message_type == "stop_session":
                     # Send acknowledgment IMMEDIATELY so client UI transitions instantly
                     try:
-                        await websocket.send_text(json.dumps({"type": "session_stopped"}))
+                        await websocket.send_text(_SESSION_STOPPED_FRAME)
                     except Exception:
                         pass  # Client may have already closed
 
                     if current_session_id:
-                        session = self.session_manager.get_session(current_session_id)
-                        if session:
-                            # Run final extraction + audio save in background
-                            asyncio.create_task(
-                                self._finalize_session(session)
-                            )
-
-                        # Clean up background extraction tracking
-                        self._extraction_running.pop(current_session_id, None)
-                        self._extraction_pending.pop(current_session_id, None)
-                        self._last_extraction_time.pop(current_session_id, None)
-                        timer = self._extraction_timer.pop(current_session_id, None)
-                        if timer:
-                            timer.cancel()
-
-                        self.session_manager.end_session(current_session_id)
+                        self._finalize_session(current_session_id, "stop")
                         current_session_id = None
 
                     break
@@ -118,37 +214,7 @@ class WebSocketHandler:
         except (WebSocketDisconnect, RuntimeError) as e:
             logger.info(f"WebSocket disconnected: {e}")
             if current_session_id:
-                # Extract any remaining transcript before ending session
-                session = self.session_manager.get_session(current_session_id)
-                if session:
-                    full_transcript = session.get_full_transcript()
-                    if full_transcript.strip():  # If there's ANY transcript left
-                        logger.info(f"Final extraction on disconnect: {len(full_transcript)} chars")
-                        try:
-                            await self._handle_extraction(
-                                session,
-                                full_transcript,
-                                websocket=None,  # No websocket since connection is closed
-                                ignore_length_check=True  # Extract regardless of length
-                            )
-                        except Exception as e:
-                            logger.error(f"Final extraction failed: {e}", exc_info=True)
-
-                    # Combine and save audio in background
-                    if session.has_audio_chunks():
-                        asyncio.create_task(
-                            self._save_session_audio(session)
-                        )
-
-                # Clean up background extraction tracking
-                self._extraction_running.pop(current_session_id, None)
-                self._extraction_pending.pop(current_session_id, None)
-                self._last_extraction_time.pop(current_session_id, None)
-                timer = self._extraction_timer.pop(current_session_id, None)
-                if timer:
-                    timer.cancel()
-
-                self.session_manager.end_session(current_session_id)
+                self._finalize_session(current_session_id, "disconnect")
 
         except Exception as e:
             logger.error(f"WebSocket error: {str(e)}", exc_info=True)
@@ -157,37 +223,40 @@ class WebSocketHandler:
             except Exception:
                 pass  # WebSocket may already be closed
             if current_session_id:
-                # Extract any remaining transcript before ending session
-                session = self.session_manager.get_session(current_session_id)
-                if session:
-                    full_transcript = session.get_full_transcript()
-                    if full_transcript.strip():  # If there's ANY transcript left
-                        logger.info(f"Final extraction on error: {len(full_transcript)} chars")
-                        try:
-                            await self._handle_extraction(
-                                session,
-                                full_transcript,
-                                websocket=None,  # No websocket since we're in error state
-                                ignore_length_check=True  # Extract regardless of length
-                            )
-                        except Exception as ex:
-                            logger.error(f"Final extraction failed: {ex}", exc_info=True)
-
-                    # Combine and save audio in background
-                    if session.has_audio_chunks():
-                        asyncio.create_task(
-                            self._save_session_audio(session)
-                        )
+                self._finalize_session(current_session_id, "error")
 
-                # Clean up background extraction tracking
-                self._extraction_running.pop(current_session_id, None)
-                self._extraction_pending.pop(current_session_id, None)
-                self._last_extraction_time.pop(current_session_id, None)
-                timer = self._extraction_timer.pop(current_session_id, None)
-                if timer:
-                    timer.cancel()
+    def _finalize_session(self, session_id: str, reason: str):
+        """End a session from any exit path (stop, disconnect, error).
 
-                self.session_manager.end_session(current_session_id)
+        Starts the final extraction + audio save in the background, then tears
+        down the per-session state. Idempotent: a second call for the same
+        session (e.g. a disconnect racing a stop) does nothing.
+        """
+        session = self.session_manager.get_session(session_id)
+        if session is None or session.finalized:
+            return
+        session.finalized = True
+
+        logger.info(f"Finalizing session {session_id} ({reason})")
+        chunk_writer = self._close_chunk_writer(session_id)
+        self._spawn(self._run_final_tasks(session, reason, chunk_writer))
+        self._cleanup_session(session_id)
+
+    def _cleanup_session(self, session_id: str):
+        """Drop per-session extraction tracking, stop the writer and end the session."""
+        st = self._ext.pop(session_id, None)
+        if st:
+            if st.timer:
+                st.timer.cancel()
+            if st.debounce_timer:
+                st.debounce_timer.cancel()
+            # The final extraction covers anything an in-flight run would have
+            # added, and the session object is recycled once finalization ends
+            if st.task and not st.task.done():
+                st.task.cancel()
+        self._stop_writer(session_id)
+
+        self.session_manager.end_session(session_id)
 
     async def _handle_start_session(
         self,
@@ -196,20 +265,21 @@ class WebSocketHandler:
     ) -> str:
         """Handle start session message."""
         try:
-            start_msg = StartSessionMessage(**message)
-            session_id = str(uuid.uuid4())
-
-            session = ConsultationSession(
-                session_id=session_id,
-                patient=start_msg.patient,
-                appointment_id=start_msg.appointmentId
-            )
+            start_msg = StartSessionMessage.model_validate(message)
+            session_id = os.urandom(16).hex()  # 128 random bits, no UUID object
 
             # Log appointment ID if provided
             if start_msg.appointmentId:
                 logger.info(f"Session started for appointment: {start_msg.appointmentId}")
 
-            self.session_manager.create_session(session)
+            session = self.session_manager.acquire_session(
+                session_id=session_id,
+                patient=start_msg.patient,
+                appointment_id=start_msg.appointmentId
+            )
+            self._start_writer(websocket, session_id)
+            session.transcript_window_chars = self.settings.extraction.max_transcript_chars
+            self._start_chunk_writer(session)
             logger.info(f"Started session {session_id} for patient: {start_msg.patient.name}")
 
             return session_id
@@ -240,18 +310,39 @@ class WebSocketHandler:
                 return True
 
             # WAV PCM data starts at byte 44
-            pcm_data = audio_bytes[44:]
-            num_samples = len(pcm_data) // 2
+            num_samples = (len(audio_bytes) - 44) // 2
 
             if num_samples == 0:
                 return True
 
-            # Parse Int16 samples and compute RMS
-            samples = struct.unpack(f'<{num_samples}h', pcm_data[:num_samples * 2])
-            sum_sq = sum(s * s for s in samples)
-            rms = (sum_sq / num_samples) ** 0.5
+            if NUMPY_AVAILABLE:
+                # Zero-copy Int16 view over the PCM section of the WAV bytes
+                samples = np.frombuffer(audio_bytes, dtype='<i2', offset=44, count=num_samples)
+            else:
+                # array.array decodes Int16 in C without an intermediate tuple
+                samples = array.array('h')
+                samples.frombytes(memoryview(audio_bytes)[44:44 + num_samples * 2])
+                if sys.byteorder != 'little':
+                    samples.byteswap()
+
+            # Energy only grows with more samples: if the head alone already
+            # reaches the whole chunk's threshold energy, the chunk is speech
+            # (the common case) and the tail needn't be scanned
+            head_squares = _sum_of_squares(samples[:_SILENCE_HEAD_SAMPLES])
+            if head_squares >= rms_threshold * rms_threshold * num_samples:
+                return False
+
+            # Peak amplitude bounds RMS from above, so a quiet peak is
+            # conclusively silent. A loud peak proves nothing (a single click
+            # in silence), so anything else needs the real RMS.
+            if _peak_amplitude(samples) < rms_threshold:
+                return True
+
+            sum_squares = head_squares + _sum_of_squares(samples[_SILENCE_HEAD_SAMPLES:])
+            rms = math.sqrt(sum_squares / num_samples)
 
-            logger.debug(f"Audio RMS energy: {rms:.1f} (threshold: {rms_threshold})")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Audio RMS energy: {rms:.1f} (threshold: {rms_threshold})")
             return rms < rms_threshold
         except Exception as e:
             logger.warning(f"Silence detection failed, processing anyway: {e}")
@@ -260,105 +351,135 @@ class WebSocketHandler:
     async def _handle_extraction(
         self,
         session: ConsultationSession,
-        full_transcript: str,
         websocket: Optional[WebSocket] = None,
         ignore_length_check: bool = False
     ):
-        """Handle extraction of structured data from transcript.
+        """Handle extraction of structured data from the session transcript.
 
         Args:
             session: The consultation session
-            full_transcript: The full transcript text to extract from
             websocket: Optional websocket to send updates (if None, extraction is logged only)
             ignore_length_check: If True, skip minimum length validation (used for final extraction)
         """
         # Check minimum length unless explicitly ignored
         if not ignore_length_check:
-            if len(full_transcript.strip()) < self.settings.extraction.min_transcript_length:
+            # O(1) cached length; every line starts with a speaker label, so no strip() needed
+            if session.full_transcript_len < self.settings.extraction.min_transcript_length:
                 logger.debug(
-                    f"Transcript too short ({len(full_transcript)} chars), "
+                    f"Transcript too short ({session.full_transcript_len} chars), "
                     f"minimum required: {self.settings.extraction.min_transcript_length}, "
                     f"skipping extraction"
                 )
                 return
 
+        # Only send the transcript tail since the last extraction; the prior
+        # extraction goes along as context and the provider merges into it.
+        # Before the first extraction the tail is the whole transcript.
+        # Snapshot the end offset now: chunks may arrive while we await.
+        transcript_end = session.full_transcript_len
+        transcript_delta = session.get_transcript_since(session.last_extraction_len)
+        if not transcript_delta.strip():
+            logger.debug("No new transcript since last extraction, skipping")
+            return
+
         # Extract structured data
-        extraction = await self.extraction_service.extract(
-            transcript=full_transcript,
-            patient=session.patient,
-            previous_extraction=session.extraction
-        )
+        async with self._ext_throttler:
+            extraction = await self.extraction_service.extract(
+                transcript=transcript_delta,
+                patient=session.patient,
+                previous_extraction=session.extraction
+            )
 
-        # Log what changed
-        if session.extraction:
-            changed_fields = []
-            if extraction.chief_complaint != session.extraction.chief_complaint:
-                changed_fields.append(f"chief_complaint: '{session.extraction.chief_complaint}' -> '{extraction.chief_complaint}'")
-            if extraction.diagnosis != session.extraction.diagnosis:
-                changed_fields.append(f"diagnosis: '{session.extraction.diagnosis}' -> '{extraction.diagnosis}'")
-            if extraction.medicine != session.extraction.medicine:
-                changed_fields.append(f"medicine: '{session.extraction.medicine}' -> '{extraction.medicine}'")
-            if extraction.advice != session.extraction.advice:
-                changed_fields.append(f"advice: '{session.extraction.advice}' -> '{extraction.advice}'")
-            if extraction.next_steps != session.extraction.next_steps:
-                changed_fields.append(f"next_steps: '{session.extraction.next_steps}' -> '{extraction.next_steps}'")
-
-            if changed_fields:
-                logger.info(f"Extraction changes: {'; '.join(changed_fields)}")
-        else:
-            logger.info(f"First extraction: {extraction.model_dump()}")
+        # Log what changed (skip the diff entirely when INFO is off)
+        if logger.isEnabledFor(logging.INFO):
+            if session.extraction:
+                prev = session.extraction
+                changed_fields = []
+                for field in _DIFF_FIELDS:
+                    old_value = getattr(prev, field)
+                    new_value = getattr(extraction, field)
+                    if new_value != old_value:
+                        changed_fields.append(f"{field}: {old_value!r} -> {new_value!r}")
+                if changed_fields:
+                    logger.info(f"Extraction changes: {'; '.join(changed_fields)}")
+            else:
+                logger.info(f"First extraction: {extraction.model_dump()}")
 
         # Merge with session extraction
         session.update_extraction(extraction)
+        session.last_extraction_len = transcript_end
+        session.last_extraction_ts = session.elapsed_seconds()
 
-        # Send update to frontend if websocket is provided
+        # Queue update for the session's writer if websocket is provided
         if websocket:
-            try:
-                update_msg = ExtractionUpdateMessage(extraction=session.extraction)
-                await websocket.send_text(update_msg.model_dump_json())
-                logger.info(f"Sent extraction update for session {session.session_id}")
-            except (RuntimeError, WebSocketDisconnect):
-                logger.debug(f"WebSocket closed, skipping extraction update for session {session.session_id}")
+            queue = self._out_queues.get(session.session_id)
+            if queue is not None:
+                # Same shape as ExtractionUpdateMessage, assembled from orjson bytes
+                queue.put_nowait(
+                    _EXTRACTION_UPDATE_PREFIX + orjson.dumps(session.extraction.model_dump()) + b"}"
+                )
+                logger.info(f"Queued extraction update for session {session.session_id}")
+            else:
+                logger.debug(f"No writer for session {session.session_id}, skipping extraction update")
+
+    @staticmethod
+    def _parse_audio_frame(frame: bytes):
+        """Split a binary audio frame into its JSON header and WAV payload.
+
+        Layout: [4-byte big-endian header length][UTF-8 JSON header][WAV bytes]
+
+        Header fields: type ("audio_chunk"), source ("mic" for the doctor,
+        "tab" for the patient; optional) and seq (client chunk number; optional).
+        """
+        if len(frame) < _AUDIO_FRAME_PREFIX.size:
+            raise ValueError("Audio frame too short")
+
+        (header_len,) = _AUDIO_FRAME_PREFIX.unpack_from(frame)
+        header_end = _AUDIO_FRAME_PREFIX.size + header_len
+        if header_end > len(frame):
+            raise ValueError("Audio frame header length exceeds frame size")
+
+        # Parse the header from a memoryview so only the WAV payload is copied
+        header = orjson.loads(memoryview(frame)[_AUDIO_FRAME_PREFIX.size:header_end])
+        return header, frame[header_end:]
 
     async def _handle_audio_chunk(
         self,
         websocket: WebSocket,
         session_id: str,
-        message: dict
+        frame: bytes
     ):
-        """Handle audio chunk message and process pipeline."""
+        """Handle a binary audio chunk frame and process pipeline."""
         try:
-            audio_msg = AudioChunkMessage(**message)
+            header, audio_bytes = self._parse_audio_frame(frame)
+            # Anything but "tab" is treated as the mic; this also keeps the
+            # value safe for use in chunk file names.
+            source = "tab" if header.get("source") == "tab" else "mic"
             session = self.session_manager.get_session(session_id)
 
             if not session:
                 await self._send_error(websocket, "Session not found")
                 return
 
-            # Decode Base64 audio data
-            audio_bytes = base64.b64decode(audio_msg.audio_data)
-            logger.debug(f"Received {len(audio_bytes)} bytes of audio")
+            logger.debug(f"Received {len(audio_bytes)} bytes of {source} audio (seq={header.get('seq')})")
 
             # Skip silent chunks to prevent Gemini hallucination
-            if self._is_silent_wav(audio_bytes):
+            loop = asyncio.get_running_loop()
+            if await loop.run_in_executor(self._audio_pool, self._is_silent_wav, audio_bytes):
                 logger.debug("Silent audio chunk, skipping transcription")
                 return
 
             # Save audio chunk to temp disk (separate track per source)
-            source = audio_msg.source or "mic"
-            chunk_index = session.mic_chunk_count if source == "mic" else session.tab_chunk_count
-            chunk_path = await self.audio_storage.save_chunk(
-                session_id=session_id,
-                chunk_bytes=audio_bytes,
-                chunk_index=chunk_index,
-                source=source
-            )
-            if chunk_path:
-                session.add_audio_chunk_path(chunk_path, source=source)
-                if source == "tab":
-                    session.tab_chunk_count += 1
-                else:
-                    session.mic_chunk_count += 1
+            # Index is reserved here; the session's chunk writer does the disk I/O
+            if source == "tab":
+                chunk_index = session.tab_chunk_count
+                session.tab_chunk_count += 1
+            else:
+                chunk_index = session.mic_chunk_count
+                session.mic_chunk_count += 1
+            chunk_queue = self._chunk_queues.get(session_id)
+            if chunk_queue is not None:
+                chunk_queue.put_nowait((audio_bytes, chunk_index, source))
 
             # Transcribe audio
             transcript = await self.transcription_service.transcribe(audio_bytes)
@@ -369,7 +490,7 @@ class WebSocketHandler:
             # Build structured chunk with speaker label and timing
             # mic = doctor (local user), tab = patient (remote participant)
             speaker = "Doctor" if source == "mic" else "Patient"
-            elapsed = (datetime.utcnow() - session.started_at).total_seconds()
+            elapsed = session.elapsed_seconds()
 
             chunk = TranscriptChunk(
                 text=transcript.strip(),
@@ -380,11 +501,15 @@ class WebSocketHandler:
             session.add_transcript_chunk(chunk)
             logger.info(f"Transcribed ({source}|{speaker}|{elapsed:.1f}s): {transcript[:100]}...")
 
-            # Get full transcript for extraction
-            full_transcript = session.get_full_transcript()
+            # Debounce: only extract once enough new text or time has accumulated
+            delay = self._debounce_delay(session)
+            if delay > 0:
+                logger.debug(f"Transcript delta below threshold, deferring extraction by {delay:.1f}s")
+                self._defer_extraction(session, websocket, delay)
+                return
 
             # Fire extraction in background (non-blocking) so audio pipeline isn't stalled
-            self._schedule_extraction(session, full_transcript, websocket)
+            self._schedule_extraction(session, websocket)
 
         except (WebSocketDisconnect, RuntimeError) as e:
             logger.warning(f"WebSocket closed during audio processing: {e}")
@@ -392,95 +517,235 @@ class WebSocketHandler:
             logger.error(f"Failed to process audio chunk: {str(e)}", exc_info=True)
             await self._send_error(websocket, f"Failed to process audio: {str(e)}")
     
-    def _schedule_extraction(self, session, full_transcript, websocket):
+    def _debounce_delay(self, session: ConsultationSession) -> float:
+        """Seconds until the session is due another extraction (0 = due now)."""
+        ext_cfg = self.settings.extraction
+        if session.full_transcript_len - session.last_extraction_len >= ext_cfg.delta_chars:
+            return 0.0
+        since_last = session.elapsed_seconds() - session.last_extraction_ts
+        return max(ext_cfg.min_interval_s - since_last, 0.0)
+
+    def _defer_extraction(self, session, websocket, delay: float):
+        """Arm a trailing timer so deferred transcript is extracted even if no more chunks arrive."""
+        st = self._ext[session.session_id]
+        if st.debounce_timer is None:
+            loop = asyncio.get_running_loop()
+            st.debounce_timer = loop.call_later(
+                delay, self._fire_debounced_extraction, session, websocket
+            )
+
+    def _fire_debounced_extraction(self, session, websocket):
+        """Debounce timer callback — extract once due, re-arming if a run reset the interval."""
+        # .get: the session may have been cleaned up since the timer was armed
+        st = self._ext.get(session.session_id)
+        if st is None:
+            return
+        st.debounce_timer = None
+        delay = self._debounce_delay(session)
+        if delay > 0:
+            self._defer_extraction(session, websocket, delay)
+        else:
+            self._schedule_extraction(session, websocket)
+
+    def _schedule_extraction(self, session, websocket):
         """Schedule extraction as a background task with throttle + single-flight dedup.
 
         Guarantees:
         - At most one extraction running per session at a time.
         - At most one extraction *started* per _EXTRACTION_THROTTLE_SECS window.
-        - The latest transcript is always used (stale queued values overwritten).
+        - The latest transcript is always used (read from the session when the run starts).
         """
         sid = session.session_id
+        st = self._ext[sid]
 
-        if self._extraction_running.get(sid):
-            # Already running — just queue latest transcript
-            self._extraction_pending[sid] = (session, full_transcript, websocket)
+        if st.running:
+            # Already running — just mark a follow-up run
+            st.pending = (session, websocket)
             return
 
         now = time.monotonic()
-        elapsed = now - self._last_extraction_time.get(sid, 0)
+        elapsed = now - st.last_time
 
         if elapsed >= self._EXTRACTION_THROTTLE_SECS:
             # Enough time since last extraction — start immediately
-            self._start_extraction_bg(sid, session, full_transcript, websocket)
+            self._start_extraction_bg(st, session, websocket)
         else:
             # Too soon — queue and schedule a timer for the remaining interval
-            self._extraction_pending[sid] = (session, full_transcript, websocket)
-            if sid not in self._extraction_timer:
+            st.pending = (session, websocket)
+            if st.timer is None:
                 delay = self._EXTRACTION_THROTTLE_SECS - elapsed
-                loop = asyncio.get_event_loop()
-                self._extraction_timer[sid] = loop.call_later(
+                loop = asyncio.get_running_loop()
+                st.timer = loop.call_later(
                     delay, self._fire_pending_extraction, sid
                 )
 
-    def _start_extraction_bg(self, sid, session, full_transcript, websocket):
+    def _start_extraction_bg(self, st, session, websocket):
         """Start a background extraction task, cancelling any pending timer."""
-        self._extraction_running[sid] = True
-        self._last_extraction_time[sid] = time.monotonic()
-        timer = self._extraction_timer.pop(sid, None)
-        if timer:
-            timer.cancel()
-        asyncio.create_task(self._run_extraction_bg(session, full_transcript, websocket))
+        st.running = True
+        st.last_time = time.monotonic()
+        if st.timer:
+            st.timer.cancel()
+            st.timer = None
+        # This run reads the latest transcript, which covers any deferred chunks
+        if st.debounce_timer:
+            st.debounce_timer.cancel()
+            st.debounce_timer = None
+        st.task = self._spawn(self._run_extraction_bg(session, websocket))
 
     def _fire_pending_extraction(self, sid):
         """Timer callback — drain queued extraction after throttle interval elapses."""
-        self._extraction_timer.pop(sid, None)
-        if sid in self._extraction_pending and not self._extraction_running.get(sid):
-            s, t, ws = self._extraction_pending.pop(sid)
-            self._start_extraction_bg(sid, s, t, ws)
+        # .get: the session may have been cleaned up since the timer was armed
+        st = self._ext.get(sid)
+        if st is None:
+            return
+        st.timer = None
+        if st.pending and not st.running:
+            s, ws = st.pending
+            st.pending = None
+            self._start_extraction_bg(st, s, ws)
 
-    async def _run_extraction_bg(self, session, full_transcript, websocket):
+    async def _run_extraction_bg(self, session, websocket):
         """Run extraction in the background, then drain any queued request."""
         sid = session.session_id
         try:
-            await self._handle_extraction(session, full_transcript, websocket)
+            await self._handle_extraction(session, websocket)
         except Exception as e:
             logger.error(f"Background extraction failed: {e}", exc_info=True)
         finally:
-            self._extraction_running[sid] = False
-            if sid in self._extraction_pending:
-                # Queued during our run — start immediately (already waited)
-                s, t, ws = self._extraction_pending.pop(sid)
-                self._start_extraction_bg(sid, s, t, ws)
+            st = self._ext.get(sid)
+            if st is not None:
+                st.running = False
+                if st.pending:
+                    # Queued during our run — start immediately (already waited)
+                    s, ws = st.pending
+                    st.pending = None
+                    self._start_extraction_bg(st, s, ws)
+
+    def _start_writer(self, websocket: WebSocket, sid: str):
+        """Create the session's outbound queue and the task that drains it."""
+        queue = asyncio.Queue()
+        self._out_queues[sid] = queue
+        self._writer_tasks[sid] = asyncio.create_task(self._writer_loop(websocket, sid, queue))
+
+    def _stop_writer(self, sid: str):
+        """Drop the session's outbound queue and cancel its writer task."""
+        self._out_queues.pop(sid, None)
+        task = self._writer_tasks.pop(sid, None)
+        if task:
+            task.cancel()
+
+    async def _writer_loop(self, websocket: WebSocket, sid: str, queue: asyncio.Queue):
+        """Send queued pre-serialized messages, coalescing everything queued since the last send.
+
+        A lone message goes out as-is; a burst goes out as one
+        {"type": "batch", "items": [...]} frame.
+        """
+        try:
+            while True:
+                batch = [await queue.get()]
+                while True:
+                    try:
+                        batch.append(queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+
+                if len(batch) == 1:
+                    frame = batch[0]
+                else:
+                    frame = _BATCH_PREFIX + b",".join(batch) + b"]}"
+                await websocket.send_text(frame.decode())
+                logger.info(f"Sent {len(batch)} queued message(s) for session {sid}")
+        except (RuntimeError, WebSocketDisconnect):
+            logger.debug(f"WebSocket closed, stopping writer for session {sid}")
+
+    def _start_chunk_writer(self, session: ConsultationSession):
+        """Create the session's audio chunk queue and the task that persists it."""
+        queue = asyncio.Queue()
+        self._chunk_queues[session.session_id] = queue
+        self._chunk_writers[session.session_id] = self._spawn(
+            self._chunk_writer_loop(session, queue)
+        )
+
+    def _close_chunk_writer(self, sid: str) -> Optional[asyncio.Task]:
+        """Stop accepting chunks for the session; the writer exits once drained."""
+        queue = self._chunk_queues.pop(sid, None)
+        if queue is not None:
+            queue.put_nowait(None)
+        return self._chunk_writers.pop(sid, None)
+
+    async def _chunk_writer_loop(self, session: ConsultationSession, queue: asyncio.Queue):
+        """Write queued audio chunks to temp storage in arrival order."""
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            audio_bytes, chunk_index, source = item
+            try:
+                chunk_path = await self.audio_storage.save_chunk(
+                    session_id=session.session_id,
+                    chunk_bytes=audio_bytes,
+                    chunk_index=chunk_index,
+                    source=source
+                )
+                if chunk_path:
+                    session.add_audio_chunk_path(chunk_path, source=source)
+            except Exception as e:
+                logger.error(f"Failed to save audio chunk {source}/{chunk_index}: {e}", exc_info=True)
 
     async def _send_error(self, websocket: WebSocket, message: str):
         """Send error message to client."""
         try:
-            error_msg = ErrorMessage(message=message)
-            await websocket.send_text(error_msg.model_dump_json())
+            frame = _CACHED_ERROR_FRAMES.get(message)
+            if frame is None:
+                # Same shape as ErrorMessage; orjson handles string escaping
+                frame = f'{{"type":"error","message":{orjson.dumps(message).decode()}}}'
+            await websocket.send_text(frame)
         except Exception as e:
             logger.error(f"Failed to send error message: {str(e)}")
 
-    async def _finalize_session(self, session: ConsultationSession):
-        """Background task to run final extraction and save audio after session ends."""
+    async def _run_final_tasks(
+        self,
+        session: ConsultationSession,
+        reason: str,
+        chunk_writer: Optional[asyncio.Task] = None
+    ):
+        """Background task to run final extraction and save audio after session ends.
+
+        Extraction waits on the LLM API and the save waits on disk, so the two
+        run concurrently.
+        """
+        tasks = []
+        if session.full_transcript_len:  # If there's ANY transcript
+            logger.info(f"Final extraction on {reason}: {session.full_transcript_len} chars")
+            tasks.append(self._handle_extraction(
+                session,
+                websocket=None,
+                ignore_length_check=True  # Extract regardless of length
+            ))
+        tasks.append(self._drain_and_save_audio(session, chunk_writer))
+
         try:
-            full_transcript = session.get_full_transcript()
-            if full_transcript.strip():
-                logger.info(f"Final extraction on stop: {len(full_transcript)} chars")
-                try:
-                    await self._handle_extraction(
-                        session,
-                        full_transcript,
-                        websocket=None,
-                        ignore_length_check=True
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(
+                        f"Session finalization failed: {result}",
+                        exc_info=(type(result), result, result.__traceback__)
                     )
-                except Exception as e:
-                    logger.error(f"Final extraction failed: {e}", exc_info=True)
+        finally:
+            self.session_manager.release_session(session)
 
-            if session.has_audio_chunks():
+    async def _drain_and_save_audio(
+        self,
+        session: ConsultationSession,
+        chunk_writer: Optional[asyncio.Task]
+    ):
+        """Wait for queued chunk writes to land, then combine and save the audio."""
+        if chunk_writer is not None:
+            await chunk_writer
+        if session.has_audio_chunks():
+            async with self._save_sem:
                 await self._save_session_audio(session)
-        except Exception as e:
-            logger.error(f"Session finalization failed: {e}", exc_info=True)
 
     async def _save_session_audio(self, session: ConsultationSession):
         """
@@ -0,0 +1,5 @@
+"""Shared pytest setup: make the repo root importable so tests can use `src.*`."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,86 @@
+"""Tests for ConsultationSession state handling and the rolling transcript window."""
+from src.models.consultation import ConsultationSession, TranscriptChunk
+from src.models.extraction import ExtractionResult
+from src.models.patient import Patient
+
+_IDENTITY_FIELDS = {"session_id", "patient", "appointment_id", "started_at"}
+
+
+def _session(**kwargs):
+    return ConsultationSession(
+        session_id="s1", patient=Patient(name="A", age=30, gender="F"), **kwargs
+    )
+
+
+def _chunk(text, speaker="Doctor"):
+    return TranscriptChunk(text=text, source="mic", speaker=speaker, timestamp=0.0)
+
+
+def test_reset_restores_every_per_session_field():
+    session = _session(transcript_window_chars=50)
+    started = session._start_monotonic
+    for i in range(5):
+        session.add_transcript_chunk(_chunk(f"line number {i}"))
+    session.get_transcript_since(0)
+    session.update_extraction(ExtractionResult(chief_complaint="headache"))
+    session.mic_chunk_paths.append("mic_0.wav")
+    session.tab_chunk_paths.append("tab_0.wav")
+    session.mic_chunk_count = session.tab_chunk_count = 1
+    session.audio_saved_path = "out.wav"
+    session.finalized = True
+    session.last_extraction_len = 40
+    session.last_extraction_ts = 12.5
+
+    session.reset()
+
+    fresh = _session()
+    assert session.model_dump(exclude=_IDENTITY_FIELDS) == fresh.model_dump(exclude=_IDENTITY_FIELDS)
+    private = dict(session.__pydantic_private__)
+    fresh_private = dict(fresh.__pydantic_private__)
+    assert private.pop("_start_monotonic") >= started
+    fresh_private.pop("_start_monotonic")
+    assert private == fresh_private
+
+
+def _windowed_session(window_chars, *lines):
+    session = _session(transcript_window_chars=window_chars)
+    for speaker, text in lines:
+        session.add_transcript_chunk(_chunk(text, speaker))
+    return session
+
+
+_LINES = [("Doctor", "aaaa"), ("Patient", "bbbb"), ("Doctor", "cccc")]
+
+
+def test_offsets_count_newline_prefixes_across_eviction():
+    # 12 + 14 + 13 chars ("\n"-prefixed after the first line); 30 evicts the first
+    session = _windowed_session(30, *_LINES)
+    full = session.get_full_transcript()
+
+    assert session.full_transcript_len == len(full) == 39
+    assert session._window_start == 12
+    for offset in range(session._window_start, len(full) + 1):
+        assert session.get_transcript_since(offset) == full[offset:].lstrip("\n")
+
+
+def test_offset_before_window_start_returns_retained_text():
+    session = _windowed_session(30, *_LINES)
+
+    assert session.get_transcript_since(0) == "Patient: bbbb\nDoctor: cccc"
+    assert session.get_transcript_since(5) == session.get_transcript_since(12)
+
+
+def test_transcript_since_strips_only_the_boundary_newline():
+    session = _windowed_session(1000, *_LINES)
+    first_line_end = len("Doctor: aaaa")
+
+    assert session.get_transcript_since(first_line_end) == "Patient: bbbb\nDoctor: cccc"
+    assert session.get_transcript_since(first_line_end + 1) == "Patient: bbbb\nDoctor: cccc"
+    assert session.get_transcript_since(session.full_transcript_len) == ""
+
+
+def test_window_keeps_newest_line_even_if_over_limit():
+    session = _windowed_session(10, ("Doctor", "short"), ("Patient", "a much longer line"))
+
+    assert session.get_transcript_since(0) == "Patient: a much longer line"
+    assert session.full_transcript_len == len(session.get_full_transcript())
@@ -0,0 +1,77 @@
+"""Tests for PatientHistoryManager batch ingestion."""
+import asyncio
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+
+import pytest
+
+history_manager = pytest.importorskip("src.vector_db.patient_history.history_manager")
+PatientHistoryManager = history_manager.PatientHistoryManager
+
+
+class _FakeCollection:
+    """Minimal Chroma collection that rejects duplicate IDs like the real one."""
+
+    def __init__(self):
+        self.ids = []
+
+    def add(self, ids, embeddings, documents, metadatas):
+        if len(set(ids)) != len(ids) or set(ids) & set(self.ids):
+            raise ValueError("Expected IDs to be unique")
+        self.ids.extend(ids)
+
+
+class _FakeEmbeddings:
+    async def generate_batch_embeddings(self, texts, batch_size=32):
+        return [[0.0, 1.0] for _ in texts]
+
+
+class _FakeSearchEngine:
+    def __init__(self):
+        self.indexed = []
+
+    def add_to_index(self, patient_ids, record_ids, embeddings):
+        self.indexed.extend(record_ids)
+
+
+def _make_manager():
+    manager = PatientHistoryManager.__new__(PatientHistoryManager)
+    manager.logger = logging.getLogger(__name__)
+    manager.collection = _FakeCollection()
+    manager.embedding_generator = _FakeEmbeddings()
+    manager.search_engine = _FakeSearchEngine()
+    manager._history_index = sqlite3.connect(":memory:", check_same_thread=False)
+    manager._history_index_lock = threading.Lock()
+    manager._history_index.executescript(
+        "CREATE TABLE idx (patient_id TEXT, ts TEXT, rid TEXT PRIMARY KEY);"
+    )
+    return manager
+
+
+class _FrozenDatetime(datetime):
+    """Every record in the batch sees the same microsecond."""
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 1, 1, 12, 0, 0, 123456)
+
+
+def test_batch_with_two_records_for_one_patient_gets_unique_ids(monkeypatch):
+    monkeypatch.setattr(history_manager, "datetime", _FrozenDatetime)
+    manager = _make_manager()
+    records = [
+        ("patient-1", {"clinical_summary": "first visit"}, "transcript one"),
+        ("patient-1", {"clinical_summary": "second visit"}, "transcript two"),
+    ]
+
+    record_ids = asyncio.run(manager.store_patient_records_batch(records))
+
+    assert len(record_ids) == 2
+    assert len(set(record_ids)) == 2
+    assert manager.collection.ids == record_ids
+    indexed = manager._history_index.execute(
+        "SELECT rid FROM idx WHERE patient_id = ?", ("patient-1",)
+    ).fetchall()
+    assert sorted(row[0] for row in indexed) == sorted(record_ids)
@@ -0,0 +1,95 @@
+"""Tests for SemanticSearchEngine's per-patient vector cache."""
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+
+import numpy as np
+import pytest
+
+semantic_search = pytest.importorskip("src.vector_db.search.semantic_search")
+SemanticSearchEngine = semantic_search.SemanticSearchEngine
+
+
+class _FakeCollection:
+    """Chroma collection stub that counts `get` calls per patient.
+
+    Patients listed in `records` have one stored vector each; everyone else has none.
+    """
+
+    def __init__(self, records=()):
+        self.records = set(records)
+        self.get_calls = Counter()
+
+    def get(self, where=None, ids=None, include=None):
+        patient_id = where["patient_id"]
+        self.get_calls[patient_id] += 1
+        if patient_id not in self.records:
+            return {"ids": [], "embeddings": []}
+        return {"ids": [f"{patient_id}_r"], "embeddings": [[1.0, 0.0, 0.0]]}
+
+
+def _make_engine(records=()):
+    engine = SemanticSearchEngine.__new__(SemanticSearchEngine)
+    engine.logger = logging.getLogger(__name__)
+    engine.collection = _FakeCollection(records)
+    engine._patient_vectors = OrderedDict()
+    engine._patient_cache_vectors = 0
+    engine._patient_versions = {}
+    engine._patient_loads = {}
+    engine._next_version = 0
+    engine._exact_cache = OrderedDict()
+    engine._exact_cache_generation = 0
+    return engine
+
+
+def test_patient_without_records_is_cached_as_empty():
+    engine = _make_engine()
+
+    first = asyncio.run(engine._get_patient_vectors("p1"))
+    second = asyncio.run(engine._get_patient_vectors("p1"))
+
+    assert first is not None and first[0] == []
+    assert second is first
+    assert engine.collection.get_calls["p1"] == 1
+
+    results = asyncio.run(engine._search_patient_vectors(first, np.ones(3), 5))
+    assert results == ([], [], [], [])
+
+
+def test_add_to_index_extends_empty_patient_entry():
+    engine = _make_engine()
+    asyncio.run(engine._get_patient_vectors("p1"))
+
+    engine.add_to_index(["p1"], ["r1"], np.array([[1.0, 2.0, 3.0]]))
+
+    ids, vectors, sq_norms = engine._patient_vectors["p1"]
+    assert ids == ["r1"]
+    assert vectors.shape == (1, 3)
+    assert sq_norms.tolist() == [14.0]
+
+
+def test_patient_vector_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(SemanticSearchEngine, "_PATIENT_CACHE_MAX_VECTORS", 2)
+    engine = _make_engine(records=["p1", "p2", "p3"])
+
+    asyncio.run(engine._get_patient_vectors("p1"))
+    asyncio.run(engine._get_patient_vectors("p2"))
+    asyncio.run(engine._get_patient_vectors("p1"))  # hit: p2 is now the oldest
+    asyncio.run(engine._get_patient_vectors("p3"))
+
+    assert list(engine._patient_vectors) == ["p1", "p3"]
+    assert engine._patient_cache_vectors == 2
+    assert set(engine._patient_versions) == {"p1", "p3"}
+
+    asyncio.run(engine._get_patient_vectors("p2"))
+    assert engine.collection.get_calls == {"p1": 1, "p2": 2, "p3": 1}
+    assert list(engine._patient_vectors) == ["p3", "p2"]
+
+
+def test_add_to_index_ignores_patients_not_cached():
+    engine = _make_engine()
+
+    engine.add_to_index(["p1"], ["r1"], np.array([[1.0, 2.0, 3.0]]))
+
+    assert engine._patient_vectors == {}
+    assert engine._patient_versions == {}
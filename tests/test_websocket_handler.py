@@ -0,0 +1,210 @@
+"""Tests for WebSocketHandler's audio frame parsing, silence detection, extraction and session reuse."""
+import asyncio
+import struct
+from collections import defaultdict
+from types import SimpleNamespace
+
+import pytest
+
+from src.config.settings import AudioSettings, ExtractionConfig
+from src.models.consultation import ConsultationSession, TranscriptChunk
+from src.models.extraction import ExtractionResult
+from src.models.patient import Patient
+from src.services.session_manager import SessionManager
+
+websocket_handler = pytest.importorskip("src.websocket_handler")
+WebSocketHandler = websocket_handler.WebSocketHandler
+
+_WAV_HEADER = b"\0" * 44
+
+
+def _wav(samples, trailing=b""):
+    return _WAV_HEADER + struct.pack(f"<{len(samples)}h", *samples) + trailing
+
+
+def _click_in_silence():
+    samples = [0] * 16000
+    samples[100] = 10000  # far above the threshold, but RMS stays ~79
+    return _wav(samples)
+
+
+SILENCE_CASES = [
+    ("header_only", _WAV_HEADER, True),
+    ("silent", _wav([0] * 16000), True),
+    ("quiet", _wav([50, -50] * 8000), True),
+    ("loud", _wav([3000, -3000] * 8000), False),
+    ("full_scale_negative", _wav([-32768] * 16000), False),
+    ("click_in_silence", _click_in_silence(), True),
+    ("loud_head_silent_tail", _wav([20000, -20000] * 512 + [0] * 15000), False),
+    # Head energy alone is under the whole chunk's threshold; true RMS is 160
+    ("moderate_head_silent_tail", _wav([1000, -1000] * 512 + [0] * 38976), True),
+    ("odd_length_quiet", _wav([50, -50] * 8000, trailing=b"\x7f"), True),
+    ("odd_length_loud", _wav([3000, -3000] * 8000, trailing=b"\x7f"), False),
+]
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "no_numpy"])
+def numpy_path(request, monkeypatch):
+    if request.param and not websocket_handler.NUMPY_AVAILABLE:
+        pytest.skip("numpy not installed")
+    monkeypatch.setattr(websocket_handler, "NUMPY_AVAILABLE", request.param)
+
+
+@pytest.mark.parametrize("audio,expected", [c[1:] for c in SILENCE_CASES], ids=[c[0] for c in SILENCE_CASES])
+def test_is_silent_wav(numpy_path, audio, expected):
+    assert WebSocketHandler._is_silent_wav(audio) is expected
+
+
+def test_loud_head_skips_scanning_the_tail(numpy_path, monkeypatch):
+    scanned = []
+    sum_of_squares = websocket_handler._sum_of_squares
+    monkeypatch.setattr(
+        websocket_handler, "_sum_of_squares", lambda samples: scanned.append(len(samples)) or sum_of_squares(samples)
+    )
+
+    assert WebSocketHandler._is_silent_wav(_wav([20000, -20000] * 512 + [0] * 15000)) is False
+    assert scanned == [1024]
+
+
+def _frame(header: bytes, payload: bytes = b"", header_len=None):
+    length = len(header) if header_len is None else header_len
+    return struct.pack(">I", length) + header + payload
+
+
+def test_parse_audio_frame_splits_header_and_payload():
+    header, payload = WebSocketHandler._parse_audio_frame(
+        _frame(b'{"type":"audio_chunk","source":"mic","seq":3}', b"RIFF")
+    )
+    assert header == {"type": "audio_chunk", "source": "mic", "seq": 3}
+    assert payload == b"RIFF"
+
+
+@pytest.mark.parametrize("frame,message", [
+    (b"", "too short"),
+    (b"\0\0\0", "too short"),
+    (_frame(b'{"type":"audio_chunk"}', header_len=100), "exceeds frame size"),
+    (_frame(b"{}", header_len=0xFFFFFFFF), "exceeds frame size"),
+], ids=["empty", "truncated_prefix", "length_past_end", "max_length"])
+def test_parse_audio_frame_rejects_malformed(frame, message):
+    with pytest.raises(ValueError, match=message):
+        WebSocketHandler._parse_audio_frame(frame)
+
+
+def _debounce_handler(min_interval_s):
+    handler = WebSocketHandler.__new__(WebSocketHandler)
+    handler.settings = SimpleNamespace(
+        extraction=ExtractionConfig(provider="test", model="test", delta_chars=200, min_interval_s=min_interval_s)
+    )
+    handler._ext = defaultdict(websocket_handler.SessionExtractionState)
+    handler.scheduled = []
+    handler._schedule_extraction = lambda session, websocket: handler.scheduled.append(session.session_id)
+    return handler
+
+
+def _debounce_session():
+    session = ConsultationSession(session_id="s1", patient=Patient(name="A", age=30, gender="F"))
+    session.add_transcript_chunk(TranscriptChunk(text="short", source="mic", speaker="Doctor", timestamp=0.0))
+    return session
+
+
+def test_new_session_is_not_due_before_min_interval():
+    # last_extraction_ts is session-relative, so 0.0 means "session start", not "long ago"
+    handler = _debounce_handler(min_interval_s=15.0)
+    assert handler._debounce_delay(_debounce_session()) > 14.0
+
+
+def test_deferred_transcript_is_extracted_by_trailing_timer():
+    async def run():
+        handler = _debounce_handler(min_interval_s=0.05)
+        session = _debounce_session()
+
+        delay = handler._debounce_delay(session)
+        assert delay > 0
+        handler._defer_extraction(session, None, delay)
+        handler._defer_extraction(session, None, delay)  # a second deferral reuses the timer
+
+        await asyncio.sleep(0.1)  # no further chunks arrive
+        return handler
+
+    handler = asyncio.run(run())
+    assert handler.scheduled == ["s1"]
+    assert handler._ext["s1"].debounce_timer is None
+
+
+class _BlockingExtractionService:
+    """First extract() waits on `gate` (an in-flight background run); later calls return at once."""
+
+    def __init__(self):
+        self.gate = asyncio.get_running_loop().create_future()
+        self.calls = 0
+
+    async def extract(self, transcript, patient, previous_extraction=None):
+        self.calls += 1
+        if self.calls == 1:
+            return await self.gate
+        return ExtractionResult(chief_complaint="final")
+
+
+class _FakeWebSocket:
+    async def send_text(self, text):
+        pass
+
+
+def test_recycled_session_gets_no_update_from_in_flight_extraction():
+    patient = Patient(name="A", age=30, gender="F")
+
+    async def run():
+        settings = SimpleNamespace(
+            extraction=ExtractionConfig(provider="test", model="test", max_transcript_chars=500),
+            audio=AudioSettings(),
+        )
+        extraction_service = _BlockingExtractionService()
+        manager = SessionManager()
+        handler = WebSocketHandler(settings, None, extraction_service, manager, None)
+        websocket = _FakeWebSocket()
+
+        old_id = await handler._handle_start_session(
+            websocket, {"type": "start_session", "patient": patient.model_dump(), "appointmentId": "appt-1"}
+        )
+        old = manager.get_session(old_id)
+        old.add_transcript_chunk(
+            TranscriptChunk(text="I have had a headache for three days.", source="tab", speaker="Patient", timestamp=0.0)
+        )
+        handler._schedule_extraction(old, websocket)
+        in_flight = handler._ext[old_id].task
+        await asyncio.sleep(0)
+        assert extraction_service.calls == 1  # background run is now blocked in extract()
+
+        handler._finalize_session(old_id, "stop")
+        await asyncio.gather(*(handler._bg_tasks - {in_flight}), return_exceptions=True)
+
+        # Released sessions are emptied before they go back on the free list
+        assert list(manager._free_sessions) == [old]
+        assert old.transcript_chunks == []
+        assert old.full_transcript_len == 0
+        assert old.extraction == ExtractionResult()
+        assert old.appointment_id is None
+
+        new_id = await handler._handle_start_session(websocket, {"type": "start_session", "patient": patient.model_dump()})
+        new = manager.get_session(new_id)
+        assert new is old  # the pooled object was reused
+
+        # The stale run would resume here if it had not been cancelled
+        # (cancelling it also cancels the gate it was awaiting)
+        if not extraction_service.gate.done():
+            extraction_service.gate.set_result(ExtractionResult(chief_complaint="stale"))
+        await asyncio.gather(in_flight, return_exceptions=True)
+
+        handler._close_chunk_writer(new_id)
+        handler._cleanup_session(new_id)
+        await asyncio.gather(*handler._bg_tasks, return_exceptions=True)
+        handler._audio_pool.shutdown()
+        return new, new_id
+
+    new, new_id = asyncio.run(run())
+    assert new.session_id == new_id
+    assert new.extraction == ExtractionResult()
+    assert new.last_extraction_len == 0
+    assert new.full_transcript_len == 0
+    assert new.transcript_chunks == []
+    assert new.transcript_window_chars == 500